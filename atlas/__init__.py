@@ -9,41 +9,73 @@
         :license: MIT, see LICENSE for more details.
 """
 
+import csv
+import tempfile
+import time
 import zipfile
 
-import requests
 import StringIO
-import urllib2
+
+from atlas import cache, instrument, session
+from atlas.energy import lmp
+from atlas.lazy import LazyModule
+
+pandas = LazyModule('pandas')
+urllib2 = LazyModule('urllib2')
+
+
+# bytes pulled off the socket per read when streaming a download
+STREAM_BLOCK_SIZE = 1024 * 1024
+# streamed downloads larger than this spill from memory to disk
+SPOOL_MAX_SIZE = 32 * 1024 * 1024
+# csv rows parsed into each DataFrame chunk yielded by get_data_iter
+STREAM_CHUNK_ROWS = 100000
+# the UTF-8 byte order mark some files start with
+UTF8_BOM = '\xef\xbb\xbf'
+
+
+class NotModified(Exception):
+    """This exception is raised by get_stream when a conditional 
+    request finds the url unchanged since the validators sent.
+    """
+    pass
 
 
 class BaseCollectEvent():
     """This is the Super Class for all collection events."""
     
+    # raw csv column whose rows must land in the same streamed chunk
+    stream_group = None
+    # whether downloads check the server certificate
+    verify_ssl = False
+    # raw csv column holding the node, for the nodes option
+    node_col = None
+    # whether get_data reads through the atlas.cache caches; a poller
+    # turns this off to always ask the server
+    use_cache = True
+    
     def __init__(self, **kwargs):
-        pass
+        self.set_nodes(kwargs.get('nodes'))
+        self.rows_accepted = 0
+        self.rows_rejected = 0
+        # rejected row counts by reason
+        self.rejects = {}
+        # extra headers of the GET, e.g. If-None-Match for a poller
+        self.request_headers = None
+        # headers of the last response, for its ETag and Last-Modified
+        self.response_headers = {}
         
     def get_file(self):
         """This method generates a GET request on the self.url 
-        resource. It returns a StringIO file object. We cannot 
-        use requests library on ftp server so we use urllib2 in 
-        the case that our url ends with 'ftp'.
+        resource. It returns a file object of the raw body, or of the 
+        extracted member when self.filename starts with 'zip'.
         """
-        if self.url[0:3] == 'ftp':
-            resp = urllib2.urlopen(self.url)
-            f = StringIO.StringIO()
-            f.write(resp.read())
-            f.seek(0)
-            self.fileobject = f
-        elif self.filename[0:3] == 'zip':
-            url = urllib2.urlopen(self.url)
-            f = self.extract_file(self.filename, url)
-            self.fileobject = f
-        else:
-            r = requests.get(self.url, verify=False)
-            f = StringIO.StringIO() 
-            f.write(r.content)
-            f.seek(0)
-            self.fileobject = f
+        f = self.open_raw()
+        if self.filename[0:3] == 'zip':
+            f = self.run_stage('extract_file', self.extract_file, 
+                self.filename, f)
+        self.fileobject = f
+        return self.fileobject
     
     def extract_file(self, i_filename, i_filedata):
         """Open zipfile and return file-like object."""
@@ -58,22 +90,331 @@ class BaseCollectEvent():
         output.write(input_zip.read(i_filename))
         output.seek(0)
         return output
+    
+    def get_stream(self):
+        """This method generates a GET request on the self.url 
+        resource and copies the body in blocks into a spooled 
+        temporary file, so large downloads never sit in memory whole. 
+        We cannot use requests library on ftp server so we use urllib2 
+        in the case that our url starts with 'ftp'. Everything else 
+        goes through the shared atlas.session connection pool, with 
+        self.request_headers added; a 304 reply raises NotModified and 
+        an error status raises requests' HTTPError, so an error page 
+        is never parsed or cached.
+        """
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        if self.url[0:3] == 'ftp':
+            resp = urllib2.urlopen(self.url, timeout=session.get_timeout())
+            block = resp.read(STREAM_BLOCK_SIZE)
+            while block:
+                spool.write(block)
+                block = resp.read(STREAM_BLOCK_SIZE)
+        else:
+            r = session.get(self.url, verify=self.verify_ssl, stream=True, 
+                headers=self.request_headers)
+            self.response_headers = r.headers
+            if r.status_code == 304:
+                r.close()
+                raise NotModified(self.url)
+            if r.status_code >= 400:
+                r.close()
+                r.raise_for_status()
+            for block in r.iter_content(STREAM_BLOCK_SIZE):
+                spool.write(block)
+        spool.seek(0)
+        return spool
+    
+    def open_raw(self):
+        """This method returns a binary file object of the raw self.url 
+        resource. When an atlas.cache raw cache is set and use_cache 
+        is on it is served from disk, and a miss is downloaded once 
+        and stored.
+        """
+        raw_cache = cache.get_cache() if self.use_cache else None
+        if raw_cache is None:
+            return self.get_stream()
+        f = raw_cache.open(self.url, self.cache_ttl())
+        if f is None:
+            f = raw_cache.put(self.url, self.get_stream())
+        return f
+    
+    def get_delivery_date(self):
+        """This method returns the delivery date of self.url as a 
+        YYYYMMDD string, or None when the url does not tell.
+        """
+        return None
+    
+    def cache_ttl(self):
+        """This method returns how many seconds a cached copy of 
+        self.url stays fresh, or None when the file is final.
+        """
+        return cache.DATATYPE_TTL.get(getattr(self, 'datatype', None))
+    
+    def open_member(self, i_zipfile):
+        """This method opens the archive member to parse as a file 
+        object that decompresses as it is read.
+        """
+        if len(i_zipfile.namelist()) == 1:
+            self.filename = i_zipfile.namelist()[0]
+        return i_zipfile.open(self.filename)
         
-    def get_data(self):
+    def get_data(self, nodes=None, processes=None):
         """This method returns a Pandas DataFrame of the data. It 
-        executes the entire extract and transform workflow.
+        executes the entire extract and transform workflow, as 
+        fetch_data followed by parse_data when the frame is not 
+        cached. nodes overrides the nodes the collector was built 
+        with, for collectors with a node_col. With processes set the 
+        file is parsed in chunks over a pool of that many processes, 
+        see atlas.parallel.
         """
-        self.get_file()
-        csv_list = self.get_csv_list_from_str(self.fileobject.read())
-        payload = self.load_data(csv_list)
-        del csv_list
+        payload = self.fetch_data(nodes)
+        if payload is None:
+            payload = self.parse_data(processes)
         return payload
     
+    def fetch_data(self, nodes=None):
+        """This method is the I/O half of get_data. With an 
+        atlas.cache frame cache set and use_cache on, a url seen 
+        before is loaded from disk and returned. Otherwise it 
+        downloads self.fileobject for parse_data and returns None.
+        """
+        if nodes is not None:
+            self.set_nodes(nodes)
+        frame_cache = cache.get_frame_cache() if self.use_cache else None
+        if frame_cache is not None:
+            payload = frame_cache.load(self)
+            if payload is not None:
+                if self.nodes is not None and self.node_col is not None:
+                    payload = payload[payload['node'].isin(self.nodes)]
+                    payload = payload.reset_index(drop=True)
+                self.data = payload
+                return payload
+        self.run_stage('get_file', self.get_file)
+        return None
+    
+    def parse_data(self, processes=None):
+        """This method is the CPU half of get_data. It parses the 
+        self.fileobject downloaded by fetch_data, reports the row 
+        counts and stores the result in the frame cache, unless it is 
+        a node subset or use_cache is off.
+        """
+        if processes:
+            payload = parallel.parse(self, processes)
+        else:
+            payload = self.parse_file()
+        self.report_rows()
+        frame_cache = cache.get_frame_cache() if self.use_cache else None
+        if frame_cache is not None and (self.nodes is None 
+                or self.node_col is None):
+            frame_cache.store(self, payload)
+        return payload
+    
+    def get_file_async(self, callback=None):
+        """This method is the non-blocking counterpart of get_file. It 
+        schedules the download on the shared atlas.aio loop and 
+        returns a CollectResult right away.
+        """
+        return aio.get_loop().get_file(self, callback)
+    
+    def get_data_async(self, callback=None, nodes=None, processes=None):
+        """This method is the non-blocking counterpart of get_data. 
+        fetch_data runs on the shared I/O pool and parse_data on the 
+        parse pool; the returned CollectResult yields the DataFrame.
+        """
+        return aio.get_loop().get_data(self, callback, nodes, processes)
+    
+    def parse_file(self):
+        """This method parses the downloaded self.fileobject into a 
+        Pandas DataFrame.
+        """
+        frame = self.run_stage('read_frame', self.read_frame, 
+            self.open_csv())
+        frame = self.select_nodes(frame)
+        return self.run_stage('load_frame', self.load_frame, frame)
+    
+    def open_csv(self):
+        """This method returns the csv text of the downloaded 
+        self.fileobject as a file object.
+        """
+        return self.fileobject
+    
+    def read_header(self, i_fileobject):
+        """This method reads i_fileobject up to and including the 
+        header row, and returns the header row.
+        """
+        return i_fileobject.readline()
+    
+    def load_chunk(self, i_frame):
+        """This method is the row-local part of load_frame, which a 
+        parse worker runs on a chunk of the raw csv rows.
+        """
+        return self.load_frame(i_frame)
+    
+    def merge_chunks(self, i_frames):
+        """This method is the whole-frame part of load_frame. It 
+        accepts the load_chunk results in file order and returns the 
+        Pandas DataFrame.
+        """
+        return lmp.concat_frames(i_frames)
+    
+    def set_nodes(self, i_nodes):
+        """This method sets the nodes to keep from an iterable of node 
+        names, or every node in the file when i_nodes is None.
+        """
+        self.nodes = None
+        if i_nodes is not None:
+            self.nodes = set(str(n).strip().upper() for n in i_nodes)
+    
+    def select_nodes(self, i_frame):
+        """This method returns the rows of the raw csv DataFrame whose 
+        node_col is in self.nodes, so the transform only converts the 
+        nodes asked for. Only the distinct node names are normalized.
+        """
+        if self.nodes is None or self.node_col is None:
+            return i_frame
+        col = [c for c in i_frame 
+            if c.strip().lower() == self.node_col.lower()][0]
+        keep = [n for n in i_frame[col].unique() 
+            if str(n).strip().upper() in self.nodes]
+        return i_frame[i_frame[col].isin(keep)].reset_index(drop=True)
+    
+    def run_stage(self, i_stage, i_func, *args, **kwargs):
+        """This method returns i_func(*args, **kwargs) and reports its 
+        wall time, and the size of the file it returns, as i_stage to 
+        the atlas.instrument instrument. Without one it is a plain call.
+        """
+        hook = instrument.get_instrument()
+        if hook is None:
+            return i_func(*args, **kwargs)
+        start = time.time()
+        result = i_func(*args, **kwargs)
+        hook.on_stage(self, i_stage, time.time() - start, 
+            _get_size(result))
+        return result
+    
+    def report_rows(self):
+        """This method reports the accepted and rejected row counts 
+        to the atlas.instrument instrument, if one is set.
+        """
+        hook = instrument.get_instrument()
+        if hook is not None:
+            hook.on_rows(self, self.rows_accepted, self.rows_rejected, 
+                self.rejects)
+    
+    def filter_rows(self, i_checks):
+        """This method accepts a list of (reason, mask) pairs, where 
+        mask flags the bad rows, and returns the mask of the rows that 
+        pass every check. Each rejected row is counted once, under the 
+        first reason it fails.
+        """
+        valid = None
+        for reason, bad in i_checks:
+            if valid is not None:
+                bad = bad & valid
+            count = int(bad.sum())
+            if count:
+                self.rejects[reason] = self.rejects.get(reason, 0) + count
+                self.rows_rejected += count
+            valid = ~bad if valid is None else valid & ~bad
+        return valid
+    
+    def get_data_iter(self, chunksize=STREAM_CHUNK_ROWS):
+        """This method is the streaming counterpart of get_data. It 
+        downloads, unzips and parses incrementally and yields Pandas 
+        DataFrames built from at most chunksize csv rows at a time. 
+        Rows that share the stream_group value at the end of a chunk 
+        are held back and parsed with the next one.
+        """
+        source = self.run_stage('get_file', self.open_raw)
+        if zipfile.is_zipfile(source):
+            source = self.open_member(zipfile.ZipFile(source))
+        else:
+            source.seek(0)
+        carry = None
+        for chunk in self.read_frame(source, chunksize=chunksize):
+            chunk = self.select_nodes(chunk)
+            if carry is not None:
+                chunk = pandas.concat([carry, chunk], ignore_index=True)
+            if self.stream_group and len(chunk):
+                key = chunk[self.stream_group]
+                run = (key != key.shift()).cumsum()
+                held = run == run.iloc[-1]
+                carry = chunk[held]
+                chunk = chunk[~held]
+            if len(chunk):
+                yield self.run_stage('load_frame', self.load_frame, chunk)
+        if carry is not None and len(carry):
+            yield self.run_stage('load_frame', self.load_frame, carry)
+        self.report_rows()
+    
+    def read_frame(self, i_fileobject, **kwargs):
+        """This method parses a csv file object straight into typed 
+        column arrays with the Pandas C parser. Subclasses override it 
+        when the header is not on the first line. Floats are parsed 
+        with the precise converter so prices match float() exactly.
+        """
+        kwargs.setdefault('float_precision', 'high')
+        return pandas.read_csv(i_fileobject, **kwargs)
+    
+    def load_data(self, i_csv_list):
+        """This method accepts a list of lists representing the csv
+        file and it returns a Pandas DataFrame. The transform itself 
+        lives in load_frame; this is kept for callers that tokenize 
+        the file themselves. The rows are written back out with the 
+        csv module, so fields holding commas or quotes survive.
+        """
+        csvfile = StringIO.StringIO()
+        csv.writer(csvfile, lineterminator='\n').writerows(i_csv_list)
+        csvfile.seek(0)
+        frame = self.run_stage('read_frame', self.read_frame, csvfile)
+        frame = self.select_nodes(frame)
+        return self.run_stage('load_frame', self.load_frame, frame)
+    
+    def __getstate__(self):
+        """This method drops the open files and the parsed data when a 
+        collector is pickled for a parse worker.
+        """
+        state = dict(self.__dict__)
+        for key in ('fileobject', 'data', 'response_headers'):
+            state.pop(key, None)
+        return state
+    
     def get_csv_list_from_str(self, i_csv_str):
         """This method returns a list of lists that represents 
-        the csv data.
+        the csv data. It is tokenized by the csv module in one pass: 
+        quoted fields may hold commas, quotes and newlines, CR LF line 
+        ends are dropped and a leading byte order mark is skipped. The 
+        fields stay strings; read_frame is where columns get typed.
+        """
+        if i_csv_str.startswith(UTF8_BOM):
+            i_csv_str = i_csv_str[len(UTF8_BOM):]
+        return [row for row in csv.reader(StringIO.StringIO(i_csv_str)) 
+            if row]
+    
+    def get_csv_row(self, i_line):
+        """This method tokenizes one line of csv, e.g. a header row 
+        read ahead of the parser, into a list of fields.
         """
-        csv_list = []
-        for x in i_csv_str.split('\n'):
-            csv_list.append(x.split(','))
-        return csv_list
\ No newline at end of file
+        rows = self.get_csv_list_from_str(i_line)
+        if rows:
+            return rows[0]
+        return []
+
+
+def _get_size(i_obj):
+    """This function returns the byte size of a file object, or of 
+    the file under a ZipFile, and None for anything else.
+    """
+    f = getattr(i_obj, 'fp', i_obj)
+    try:
+        pos = f.tell()
+        f.seek(0, 2)
+        size = f.tell()
+        f.seek(pos)
+    except Exception:
+        return None
+    return size
+
+
+from atlas import aio, parallel
+from atlas.batch import collect_range, collect_urls
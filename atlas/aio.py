@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+        atlas.aio
+        ~~~~~~~~~~~~~~
+        This file provides the non-blocking fetch backend for the
+        collector classes. Downloads run on one shared pool of I/O
+        threads and parsing is handed to a separate, smaller pool, so
+        a single process can keep hundreds of ISO requests in flight
+        while slow parses never hold up the network side.
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+import functools
+import sys
+import threading
+
+from atlas.lazy import LazyModule
+
+multiprocessing = LazyModule('multiprocessing')
+
+
+# concurrent downloads the shared loop keeps in flight
+IO_WORKERS = 128
+# concurrent parses; parsing is CPU bound so None, one per core
+PARSE_WORKERS = None
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+class CollectResult(object):
+    """This is the handle returned by the async collector methods. It
+    mirrors multiprocessing's AsyncResult.
+    """
+
+    def __init__(self, callback=None):
+        self._callback = callback
+        self._event = threading.Event()
+        self._value = None
+        self._exc_info = None
+
+    def ready(self):
+        return self._event.is_set()
+
+    def successful(self):
+        if not self.ready():
+            raise ValueError('result is not ready')
+        return self._exc_info is None
+
+    def wait(self, timeout=None):
+        self._event.wait(timeout)
+
+    def get(self, timeout=None):
+        """This method blocks until the result is ready and returns it,
+        re-raising the collector's exception if it failed.
+        """
+        self.wait(timeout)
+        if not self.ready():
+            raise multiprocessing.TimeoutError
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._value
+
+    def _set(self, value):
+        self._value = value
+        self._event.set()
+        if self._callback is not None:
+            self._callback(value)
+
+    def _fail(self, exc_info):
+        self._exc_info = exc_info
+        self._event.set()
+
+
+class CollectLoop(object):
+    """This class owns the I/O and parse pools that the async collector
+    methods are scheduled on.
+    """
+
+    def __init__(self, io_workers=IO_WORKERS, parse_workers=PARSE_WORKERS):
+        from multiprocessing.pool import ThreadPool
+        self.io_pool = ThreadPool(io_workers)
+        self.parse_pool = ThreadPool(parse_workers)
+
+    def get_file(self, collector, callback=None):
+        """This method downloads collector.url on the I/O pool and
+        returns a CollectResult for the file object.
+        """
+        result = CollectResult(callback)
+        self.io_pool.apply_async(_run, (_fetch(collector), result))
+        return result
+
+    def get_data(self, collector, callback=None, nodes=None,
+            processes=None):
+        """This method runs collector.fetch_data on the I/O pool, then
+        collector.parse_data on the parse pool unless the frame came
+        from the frame cache, and returns a CollectResult for the
+        DataFrame. nodes and processes are those of get_data.
+        """
+        result = CollectResult(callback)
+        parse = functools.partial(collector.parse_data, processes)
+
+        def schedule(payload):
+            if payload is not None:
+                result._set(payload)
+            else:
+                self.parse_pool.apply_async(_run, (parse, result))
+
+        self.io_pool.apply_async(_run,
+            (functools.partial(collector.fetch_data, nodes), result,
+                schedule))
+        return result
+
+    def close(self):
+        """This method lets the scheduled work finish and stops the
+        pools.
+        """
+        for pool in (self.io_pool, self.parse_pool):
+            pool.close()
+            pool.join()
+
+
+def get_loop():
+    """This function returns the process-wide CollectLoop, creating it
+    on first use.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = CollectLoop()
+        return _loop
+
+
+def _fetch(collector):
+    """This function returns a callable that runs collector.get_file
+    as the instrumented get_file stage.
+    """
+    return functools.partial(collector.run_stage, 'get_file',
+        collector.get_file)
+
+
+def _run(func, result, then=None):
+    """This function calls func and hands its return value to then,
+    or to result when there is nothing left to run.
+    """
+    try:
+        value = func()
+    except Exception:
+        result._fail(sys.exc_info())
+        return
+    if then is None:
+        result._set(value)
+    else:
+        then(value)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+        atlas.batch
+        ~~~~~~~~~~~~~~
+        This file provides concurrent multi-day collection on top of
+        the collector classes.
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+import datetime
+import threading
+import urlparse
+
+from atlas.energy import lmp
+from atlas.lazy import LazyModule
+
+multiprocessing = LazyModule('multiprocessing')
+pandas = LazyModule('pandas')
+
+
+# default number of concurrent downloads against any one ISO host
+HOST_CONCURRENCY = 4
+# default size of the worker pool
+WORKERS = 8
+
+_host_slots = {}
+_host_lock = threading.Lock()
+
+
+def collect_range(iso, datatype, startdate, enddate, pnode=None,
+        **kwargs):
+    """This function collects one datatype for every delivery day from
+    startdate up to but not including enddate and returns a single
+    Pandas DataFrame in day order. The per-day urls come from the
+    collector's build_url, or the multi-day windows from its build_urls
+    where it has one, and are fetched by collect_urls, which takes the
+    same keyword arguments. pnode queries a single CAISO node, which
+    OASIS serves in longer windows than all nodes.
+    """
+    try:
+        cls = _collectors()[iso.upper()]
+    except KeyError:
+        raise ValueError(
+            '{0} has no build_url, use collect_urls instead'.format(iso))
+    if hasattr(cls, 'build_urls'):
+        urls = cls.build_urls(datatype=datatype, startdate=startdate, 
+            enddate=enddate, pnode=pnode)
+        return collect_urls(cls, urls, **kwargs)
+    if pnode is not None:
+        raise ValueError(
+            '{0} urls take no pnode, use nodes instead'.format(iso))
+    days = []
+    day = startdate
+    while day < enddate:
+        days.append(day)
+        day += datetime.timedelta(days=1)
+    urls = [cls.build_url(datatype=datatype, date=d) for d in days]
+    return collect_urls(cls, urls, **kwargs)
+
+
+def collect_urls(cls, urls, workers=WORKERS,
+        host_concurrency=HOST_CONCURRENCY, processes=False, nodes=None):
+    """This function runs cls(url=url).get_data() for every url over a
+    pool of workers and concatenates the results in url order. Threads
+    are used by default since the work is mostly network wait; at most
+    host_concurrency of them hit the same host at once. With processes
+    set a process pool of min(workers, host_concurrency) is used
+    instead, which also caps the per-host concurrency. nodes limits
+    every file to those nodes.
+    """
+    if not urls:
+        return pandas.DataFrame()
+    jobs = [(cls, url, host_concurrency, nodes) for url in urls]
+    if processes:
+        pool = multiprocessing.Pool(min(workers, host_concurrency))
+    else:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(workers, len(jobs)))
+    try:
+        frames = pool.map(_collect_one, jobs, chunksize=1)
+    finally:
+        pool.terminate()
+        pool.join()
+    return lmp.concat_frames(frames)
+
+
+def _collect_one(job):
+    """This function collects one url while holding a slot for its
+    host.
+    """
+    cls, url, host_concurrency, nodes = job
+    with _get_host_slot(url, host_concurrency):
+        return cls(url=url, nodes=nodes).get_data()
+
+
+def _get_host_slot(url, host_concurrency):
+    """This function returns the semaphore that bounds the concurrent
+    requests to the host of url at host_concurrency. Slots are kept per
+    host and limit, so every call gets the limit it asked for; calls
+    running at the same time with different limits don't share them.
+    """
+    key = (urlparse.urlparse(url).netloc, host_concurrency)
+    with _host_lock:
+        if key not in _host_slots:
+            _host_slots[key] = threading.BoundedSemaphore(host_concurrency)
+        return _host_slots[key]
+
+
+def _collectors():
+    """This function maps each ISO to the collector class whose
+    build_url plans its daily files.
+    """
+    from atlas.energy import caiso, miso, spp
+    return {
+        'CAISO':    caiso.CaisoLmp,
+        'MISO':     miso.MisoLmp,
+        'SPP':      spp.SppDaLmp,
+    }
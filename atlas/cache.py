@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+        atlas.cache
+        ~~~~~~~~~~~~~~
+        This file provides the on-disk caches for collectors. The raw
+        cache stores downloads once per content hash under objects/
+        with a sqlite index mapping each url to its blob, so a re-run
+        or re-parse of published ISO files is local I/O only. The frame
+        cache stores the normalized DataFrame of each url, so a repeat
+        get_data skips the download and the parse altogether.
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+import contextlib
+import hashlib
+import os
+import sqlite3
+import tempfile
+import time
+
+
+# bytes copied per read when storing a download
+BLOCK_SIZE = 1024 * 1024
+# default cap on the bytes of all stored blobs
+MAX_BYTES = 20 * 1024 ** 3
+# bump when the output of any load_frame changes to orphan old frames
+SCHEMA_VERSION = 4
+# seconds a cached file lives for datatypes that are republished;
+# anything not listed is final once published and never goes stale
+DATATYPE_TTL = {
+    'RTLMP_PRELIM':     3600,
+    'RTLMP_RTPD':       900,
+    'HALMP_PRC':        900,
+}
+
+_cache = None
+_frame_cache = None
+
+
+class RawCache(object):
+    """This class stores raw downloads on disk keyed by url, with
+    least-recently-used eviction by total size and by age.
+    """
+
+    def __init__(self, root, max_bytes=MAX_BYTES, max_age=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        for d in ('objects', 'tmp'):
+            if not os.path.isdir(os.path.join(root, d)):
+                os.makedirs(os.path.join(root, d))
+        with self._connect() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS entries (
+                url         TEXT PRIMARY KEY,
+                digest      TEXT NOT NULL,
+                size        INTEGER NOT NULL,
+                fetched     REAL NOT NULL,
+                accessed    REAL NOT NULL)''')
+
+    def open(self, url, ttl=None):
+        """This method returns a binary file object of the cached copy
+        of url, or None when there is none or it is older than ttl
+        seconds.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT digest, fetched FROM entries WHERE url = ?',
+                (url,)).fetchone()
+            if row is None:
+                return None
+            digest, fetched = row
+            age = now - fetched
+            if ((ttl is not None and age > ttl)
+                    or (self.max_age is not None and age > self.max_age)):
+                return None
+            try:
+                f = open(self._blob_path(digest), 'rb')
+            except IOError:
+                conn.execute('DELETE FROM entries WHERE url = ?', (url,))
+                return None
+            conn.execute('UPDATE entries SET accessed = ? WHERE url = ?',
+                (now, url))
+        return f
+
+    def put(self, url, fileobject):
+        """This method stores the contents of fileobject for url and
+        returns a binary file object of the stored copy.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+        with os.fdopen(fd, 'wb') as out:
+            block = fileobject.read(BLOCK_SIZE)
+            while block:
+                digest.update(block)
+                out.write(block)
+                size += len(block)
+                block = fileobject.read(BLOCK_SIZE)
+        digest = digest.hexdigest()
+        path = self._blob_path(digest)
+        if os.path.exists(path):
+            os.remove(tmp)
+        else:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            os.rename(tmp, path)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO entries VALUES (?,?,?,?,?)',
+                (url, digest, size, now, now))
+        f = open(path, 'rb')
+        self.evict()
+        return f
+
+    def evict(self):
+        """This method drops entries older than max_age and then the
+        least recently used ones until the blobs fit in max_bytes.
+        """
+        with self._connect() as conn:
+            if self.max_age is not None:
+                old = conn.execute(
+                    'SELECT url FROM entries WHERE fetched < ?',
+                    (time.time() - self.max_age,)).fetchall()
+                for (url,) in old:
+                    self._drop(conn, url)
+            total = conn.execute('''SELECT COALESCE(SUM(size), 0) FROM
+                (SELECT DISTINCT digest, size FROM entries)''').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            lru = conn.execute(
+                'SELECT url FROM entries ORDER BY accessed').fetchall()
+            for (url,) in lru:
+                total -= self._drop(conn, url)
+                if total <= self.max_bytes:
+                    break
+
+    def clear(self):
+        """This method drops every entry and blob."""
+        with self._connect() as conn:
+            for (url,) in conn.execute('SELECT url FROM entries').fetchall():
+                self._drop(conn, url)
+
+    def _drop(self, conn, url):
+        """This method deletes the entry for url and its blob when no
+        other url shares it. It returns the bytes freed.
+        """
+        digest, size = conn.execute(
+            'SELECT digest, size FROM entries WHERE url = ?',
+            (url,)).fetchone()
+        conn.execute('DELETE FROM entries WHERE url = ?', (url,))
+        shared = conn.execute('SELECT 1 FROM entries WHERE digest = ?',
+            (digest,)).fetchone()
+        if shared is not None:
+            return 0
+        try:
+            os.remove(self._blob_path(digest))
+        except OSError:
+            pass
+        return size
+
+    def _blob_path(self, digest):
+        """This method returns where the blob with digest is stored."""
+        return os.path.join(self.root, 'objects', digest[:2], digest)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """This method yields an index connection that commits on
+        success and is always closed.
+        """
+        conn = sqlite3.connect(
+            os.path.join(self.root, 'index.sqlite'), timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+class FrameCache(object):
+    """This class stores the DataFrame returned by get_data on disk as 
+    Feather or Parquet, one file per url under iso/datatype/delivery 
+    date. Files are read back memory-mapped. It needs pyarrow.
+    """
+
+    def __init__(self, root, fmt='feather'):
+        import pyarrow
+        if fmt not in ('feather', 'parquet'):
+            raise ValueError('fmt must be feather or parquet')
+        self.root = root
+        self.fmt = fmt
+
+    def load(self, collector):
+        """This method returns the cached DataFrame for the collector's
+        url, or None when there is none or it is older than the 
+        collector's cache_ttl.
+        """
+        path = self.get_path(collector)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        ttl = collector.cache_ttl()
+        if ttl is not None and time.time() - mtime > ttl:
+            return None
+        import pyarrow
+        source = pyarrow.memory_map(path, 'r')
+        if self.fmt == 'feather':
+            import pyarrow.feather
+            return pyarrow.feather.read_feather(source)
+        import pyarrow.parquet
+        return pyarrow.parquet.read_table(source).to_pandas()
+
+    def store(self, collector, frame):
+        """This method writes frame as the cached DataFrame for the 
+        collector's url.
+        """
+        import pyarrow
+        path = self.get_path(collector)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        os.close(fd)
+        frame = frame.reset_index(drop=True)
+        if self.fmt == 'feather':
+            import pyarrow.feather
+            pyarrow.feather.write_feather(frame, tmp)
+        else:
+            import pyarrow.parquet
+            pyarrow.parquet.write_table(
+                pyarrow.Table.from_pandas(frame, preserve_index=False), tmp)
+        os.rename(tmp, path)
+
+    def get_path(self, collector):
+        """This method returns where the DataFrame for the collector's 
+        url is stored.
+        """
+        name = '{0}.v{1}.{2}'.format(
+            hashlib.sha1(collector.url).hexdigest()[:16],
+            SCHEMA_VERSION,
+            self.fmt)
+        return os.path.join(self.root, collector.iso, collector.datatype,
+            collector.get_delivery_date() or 'undated', name)
+
+
+def get_cache():
+    """This function returns the raw cache collectors read through, or
+    None when caching is off.
+    """
+    return _cache
+
+
+def set_cache(cache):
+    """This function sets the raw cache collectors read through. None
+    turns caching off, which is the default.
+    """
+    global _cache
+    _cache = cache
+
+
+def get_frame_cache():
+    """This function returns the frame cache get_data reads through, 
+    or None when it is off.
+    """
+    return _frame_cache
+
+
+def set_frame_cache(cache):
+    """This function sets the frame cache get_data reads through. None
+    turns it off, which is the default.
+    """
+    global _frame_cache
+    _frame_cache = cache
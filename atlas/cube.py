@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+        atlas.cube
+        ~~~~~~~~~~~~~~
+        This file provides a persistent interval by node price cube for
+        LMP output. Each iso/datatype has a folder holding one float32
+        matrix file per price component, read and written as a NumPy
+        memmap, and the two dictionaries that give every node a column
+        and every interval a row. Rows and columns are handed out in
+        arrival order and never move, so appending a day touches only
+        its own cells, and a node subset over a time window is read
+        without loading the rest of the matrix.
+
+        The matrix is time-major with spare node columns. Intervals are
+        added by extending the files; nodes fill the spare columns, and
+        only when those run out are the files rewritten, with twice the
+        columns. The counts in cube.json are written last, so a reader
+        never sees a half-finished append. There is one writer at a
+        time.
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+import json
+import os
+import tempfile
+
+import numpy
+import pandas
+
+
+# the price components stored, one matrix file each
+COMPONENTS = ['energy', 'cong', 'loss', 'lmp']
+# dtype of the matrix cells
+CUBE_DTYPE = 'float32'
+# node columns of a new cube
+NODE_CAPACITY = 1024
+# interval rows written at a time when the matrix files grow
+COPY_ROWS = 4096
+
+
+class PriceCube(object):
+    """This class is the price cube of one iso and datatype under
+    root. It is created empty on first use.
+    """
+
+    def __init__(self, root, iso, datatype):
+        self.folder = os.path.join(root, iso, datatype)
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+        meta = self._read_meta()
+        self.capacity = meta['capacity']
+        with open(self._path('nodes.txt'), 'a+') as f:
+            f.seek(0)
+            self.nodes = f.read().splitlines()[:meta['nodes']]
+        self.node_index = dict((n, i) for i, n in enumerate(self.nodes))
+        self.times = numpy.fromfile(self._path('times.i8'), dtype='i8',
+            count=meta['times']) if meta['times'] else numpy.empty(0, 'i8')
+        self.time_index = None
+
+    def append(self, frame):
+        """This method writes the prices of a DataFrame of LMP output
+        for this iso and datatype into the cube. New nodes and
+        intervals get the next column and row; cells already held are
+        overwritten.
+        """
+        if not len(frame):
+            return
+        if self.time_index is None:
+            self.time_index = dict(
+                (t, i) for i, t in enumerate(self.times.tolist()))
+        cols = self._get_positions(frame['node'], self.node_index,
+            self.nodes)
+        added = []
+        rows = self._get_positions(
+            pandas.DatetimeIndex(frame['dt_utc']).asi8, self.time_index,
+            added)
+        old_times = len(self.times)
+        if len(self.nodes) > self.capacity:
+            self._widen(old_times)
+        self.times = numpy.append(self.times, numpy.array(added, 'i8'))
+        for c in COMPONENTS:
+            matrix = self._open_matrix(c, old_times)
+            if c in frame:
+                matrix[rows, cols] = frame[c].values.astype(CUBE_DTYPE)
+            matrix.flush()
+            del matrix
+        with open(self._path('times.i8'), 'a+b') as f:
+            f.truncate(old_times * 8)
+            f.write(self.times[old_times:].tostring())
+        fd, tmp = tempfile.mkstemp(dir=self.folder)
+        with os.fdopen(fd, 'w') as f:
+            f.write(''.join(n + '\n' for n in self.nodes))
+        os.rename(tmp, self._path('nodes.txt'))
+        self._write_meta()
+
+    def get(self, component='lmp', nodes=None, start=None, end=None):
+        """This method returns a Pandas DataFrame of one component with
+        a row per interval from start up to but not including end, in
+        time order, and a column per node of nodes, or of every node.
+        Naive datetimes are UTC. Nodes not in the cube are left out.
+        """
+        values, times, columns = self.get_array(component, nodes,
+            start, end)
+        index = pandas.DatetimeIndex(times, tz='UTC', name='dt_utc')
+        return pandas.DataFrame(values, index=index, columns=columns)
+
+    def get_array(self, component='lmp', nodes=None, start=None,
+            end=None):
+        """This method returns the cells of get as a float32 array with
+        their int64 UTC interval times and node names. Only the rows of
+        the window and the columns of the nodes are read.
+        """
+        if component not in COMPONENTS:
+            raise ValueError('no cube component {0}'.format(component))
+        if nodes is None:
+            cols = numpy.arange(len(self.nodes))
+        else:
+            cols = numpy.array([self.node_index[n] for n in
+                (str(n).upper() for n in nodes) if n in self.node_index],
+                dtype='i8')
+        keep = numpy.ones(len(self.times), dtype=bool)
+        if start is not None:
+            keep &= self.times >= _to_nanos(start)
+        if end is not None:
+            keep &= self.times < _to_nanos(end)
+        rows = numpy.flatnonzero(keep)
+        rows = rows[numpy.argsort(self.times[rows], kind='mergesort')]
+        names = [self.nodes[i] for i in cols]
+        if not len(rows) or not len(cols):
+            return (numpy.empty((len(rows), len(cols)), CUBE_DTYPE),
+                self.times[rows], names)
+        matrix = self._open_matrix(component)
+        if rows[-1] - rows[0] + 1 == len(rows) and (
+                numpy.all(numpy.diff(rows) == 1)):
+            # the usual case: intervals were appended in time order
+            block = matrix[rows[0]:rows[-1] + 1]
+        else:
+            block = matrix[rows]
+        if nodes is None:
+            values = numpy.asarray(block[:, :len(cols)])
+        else:
+            values = numpy.asarray(block[:, cols])
+        return values, self.times[rows], names
+
+    def _get_positions(self, i_values, i_index, i_added):
+        """This method returns the position of each of i_values in
+        i_index. The values not seen yet are given the next positions
+        and appended to the list i_added. Only the distinct values are
+        looked up.
+        """
+        codes, uniques = pandas.factorize(i_values)
+        positions = numpy.empty(len(uniques), dtype='i8')
+        for i, value in enumerate(uniques):
+            if value not in i_index:
+                i_index[value] = len(i_index)
+                i_added.append(value)
+            positions[i] = i_index[value]
+        return positions[codes]
+
+    def _open_matrix(self, i_component, i_rows=None):
+        """This method returns the memmap of a component's matrix, read
+        only unless i_rows is given. Then the file is first cut to its
+        first i_rows rows and extended to the rows of the times, the
+        new cells set to NaN.
+        """
+        path = self._path(i_component + '.f32')
+        if i_rows is None:
+            return numpy.memmap(path, dtype=CUBE_DTYPE, mode='r',
+                shape=(len(self.times), self.capacity))
+        row_bytes = self.capacity * numpy.dtype(CUBE_DTYPE).itemsize
+        new = len(self.times) - i_rows
+        with open(path, 'a+b') as f:
+            f.truncate(i_rows * row_bytes)
+            if new:
+                nan = numpy.full((min(new, COPY_ROWS), self.capacity),
+                    numpy.nan, CUBE_DTYPE).tostring()
+            for r in range(0, new, COPY_ROWS):
+                f.write(nan[:row_bytes * min(COPY_ROWS, new - r)])
+        return numpy.memmap(path, dtype=CUBE_DTYPE, mode='r+',
+            shape=(len(self.times), self.capacity))
+
+    def _widen(self, i_rows):
+        """This method rewrites the first i_rows rows of every matrix
+        with enough node columns for the nodes, doubling the capacity.
+        """
+        capacity = self.capacity
+        while capacity < len(self.nodes):
+            capacity *= 2
+        for c in COMPONENTS:
+            path = self._path(c + '.f32')
+            fd, tmp = tempfile.mkstemp(dir=self.folder)
+            with os.fdopen(fd, 'wb') as out:
+                old = (numpy.memmap(path, dtype=CUBE_DTYPE, mode='r',
+                    shape=(i_rows, self.capacity)) if i_rows else None)
+                for r in range(0, i_rows, COPY_ROWS):
+                    block = numpy.full((min(COPY_ROWS, i_rows - r),
+                        capacity), numpy.nan, CUBE_DTYPE)
+                    block[:, :self.capacity] = old[r:r + COPY_ROWS]
+                    out.write(block.tostring())
+                del old
+            os.rename(tmp, path)
+        self.capacity = capacity
+
+    def _read_meta(self):
+        """This method returns the counts of the last finished append."""
+        try:
+            with open(self._path('cube.json')) as f:
+                return json.load(f)
+        except IOError:
+            return {'nodes': 0, 'times': 0, 'capacity': NODE_CAPACITY}
+
+    def _write_meta(self):
+        """This method records the counts of a finished append."""
+        fd, tmp = tempfile.mkstemp(dir=self.folder)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'nodes': len(self.nodes), 'times': len(self.times),
+                'capacity': self.capacity}, f)
+        os.rename(tmp, self._path('cube.json'))
+
+    def _path(self, i_name):
+        """This method returns the path of a file of the cube."""
+        return os.path.join(self.folder, i_name)
+
+
+def append(root, frame):
+    """This function appends a DataFrame of LMP output to the cubes
+    under root of each iso and datatype in it.
+    """
+    groups = frame.groupby(['iso', 'datatype'], observed=True).indices
+    for (iso, datatype), rows in groups.items():
+        PriceCube(root, iso, datatype).append(frame.take(rows))
+
+
+def _to_nanos(i_dt):
+    """This function returns a date or datetime as int64 UTC
+    nanoseconds, taking a naive one to be UTC.
+    """
+    ts = pandas.Timestamp(i_dt)
+    if ts.tz is not None:
+        ts = ts.tz_convert('UTC').tz_localize(None)
+    return ts.value
@@ -23,69 +23,82 @@
 
 
 import datetime
+import threading
+import time
+import urlparse
 import zipfile
-import StringIO
 
-import pandas
-import requests
+from atlas import BaseCollectEvent, STREAM_CHUNK_ROWS, streams
+from atlas.energy import datatypes
+from atlas.energy.lmp import pivot_components
+from atlas.lazy import LazyModule
 
-from atlas import BaseCollectEvent
+pandas = LazyModule('pandas')
+
+
+# seconds OASIS wants between the starts of two requests
+OASIS_REQUEST_INTERVAL = 5.0
+
+_oasis_next = 0.0
+_oasis_lock = threading.Lock()
 
 
 class CaisoLmp(BaseCollectEvent):
     """This is the generic LMP Class for CAISO."""
     
+    iso = 'CAISO'
+    # CAISO lmp_type codes; MGHG is not carried
+    lmp_components = {'LMP': 'lmp', 'MCC': 'cong', 'MCL': 'loss', 
+        'MCE': 'energy'}
+    verify_ssl = True
+    node_col = 'node'
+    
     def __init__(self, **kwargs):
-        BaseCollectEvent.__init__(self)
-        self.rows_rejected = 0
-        self.rows_accepted = 0
+        BaseCollectEvent.__init__(self, **kwargs)
         self.url = kwargs.get('url')
-        self.datatype = CaisoLmp._get_datatype_from_url(url=self.url)
-        self.filename = self.get_file_name_from_url(self.url)
+        self.query = _get_query(self.url)
+        self.config = datatypes.find_config(self.iso, self.query['queryname'])
+        self.datatype = self.config['atlas_datatype']
+        self.filename = CaisoLmp._get_file_name(self.query, self.config)
         
-    def get_data(self):
-        """This method overrides the superclass method. This method 
-        generates a GET request on the self.url resource, unzips the 
-        file, and parses it into a Pandas DataFrame.
+    def open_csv(self):
+        """Overrides Superclass method. The csv text is every member 
+        of the downloaded archive in turn.
         """
-        self.fileobject = self.get_file()
-        unzipped = self.extract_file(self.fileobject)
-        csvstr = unzipped.read()
-        payload = self.load_data(self.get_csv_list_from_str(csvstr))
-        del unzipped
-        return payload
+        return self.run_stage('extract_file', self.extract_file, 
+            self.fileobject)
         
     def get_file(self):
         """This method overrides the superclass method. This method 
         generates a GET request on the self.url resource. It returns a 
-        ZipFile file object.
+        ZipFile file object and keeps it in self.fileobject.
         """
-        r = requests.get(self.url, stream=True)
-        return zipfile.ZipFile(StringIO.StringIO(r.content))
+        self.fileobject = zipfile.ZipFile(self.open_raw())
+        return self.fileobject
+    
+    def get_stream(self):
+        """Overrides Superclass method. Waits for the OASIS rate limit 
+        first, so collectors running side by side stay within it.
+        """
+        _wait_for_oasis()
+        return BaseCollectEvent.get_stream(self)
         
     def extract_file(self, i_filedata):
-        """Overrides Superclass method. Open zipfile and return 
-        StringIO file-like object.
+        """Overrides Superclass method. Returns a file object that 
+        reads every member of the archive in turn, decompressing as 
+        the parser reads and skipping the repeated header rows.
         """
-        output = StringIO.StringIO()
+        names = i_filedata.namelist()
         # override filename attr if only one file in archive
-        if len(i_filedata.namelist()) == 1:
-            self.filename = i_filedata.namelist()[0][:-3] + 'zip'
-            output.write(i_filedata.read(self.filename[:-3] + 'csv'))
-            output.seek(0)
-            return output
-        else:
-            for f in i_filedata.namelist():
-                print f
-                if f == i_filedata.namelist()[0]:
-                    output.write(i_filedata.read(f))
-                else:
-                    otemp = StringIO.StringIO()
-                    otemp.write(i_filedata.read(f))
-                    otemp.seek(0)
-                    output.write('\n'.join(otemp.readlines()[1:]))
-            output.seek(0)
-            return output
+        if len(names) == 1:
+            self.filename = names[0][:-3] + 'zip'
+        return streams.MemberReader(i_filedata, names)
+    
+    def get_delivery_date(self):
+        """Overrides Superclass method. The first delivery date is the 
+        startdatetime of the query.
+        """
+        return self.query['startdatetime'][:8]
     
     @classmethod
     def get_file_name_from_url(cls, url):
@@ -93,118 +106,150 @@ class CaisoLmp(BaseCollectEvent):
         one file exists in the zip archive, the self.filename attr 
         is overridden in self.extract_file().
         """
-        meta = CaisoLmp.datatype_config()
-        # assign datatype
-        filename_ext = [d['filename'] for d in meta 
-            if d['xml_name'] in url][0]
-        # Build a dict of url args because we need startdatetime for filename
-        ulist = url.split('&')
-        udict = {}
-        for i in ulist:
-            udict[i.split('=')[0]] = i.split('=')[1]
+        query = _get_query(url)
+        config = datatypes.find_config(cls.iso, query['queryname'])
+        return CaisoLmp._get_file_name(query, config)
+    
+    @classmethod
+    def _get_file_name(cls, query, config):
+        """This class method builds the filename from the url args and 
+        the datatype config of a url."""
         # some files don't break out the MCE, MCC, MLC; treat accordingly
         return '{0}_{1}_{2}'.format(
-            udict['startdatetime'][:8]
-            ,udict['enddatetime'][:8]
-            ,filename_ext)
+            query['startdatetime'][:8]
+            ,query['enddatetime'][:8]
+            ,config['filename'])
     
-    def load_data(self, i_csv_list):
-        """This method accepts a list of lists representing the csv
-        file and it returns a Pandas DataFrame. 
+    def get_data_iter(self, chunksize=STREAM_CHUNK_ROWS):
+        """Overrides Superclass method. The LMP components of a node 
+        can sit in different archive members, so the members are 
+        streamed into the compact long format first and the joined 
+        result is yielded in chunks of chunksize rows.
         """
-        meta = CaisoLmp.datatype_config()
-        price_col = [d['price_col'] for d in meta 
-            if d['atlas_datatype'] == self.datatype][0]
-        headers = [x.strip().upper() for x in i_csv_list[0]]
-        output = []
-        for row in i_csv_list[1:]:
-            _d = dict(zip(
-                [h.lower() for h in headers], [x.upper() for x in row]))
-            try:
-                d = {
-                    'datatype':     self.datatype,
-                    'iso':          'CAISO',
-                    'node':         _d['node'],
-                    'node_type':    '',
-                    'dt_utc':       datetime.datetime.strptime(
-                                        _d['intervalstarttime_gmt'],
-                                        '%Y-%m-%dT%H:%M:%S-00:00'),
-                    'price':        float(_d[price_col]),
-                    'lmp_type':     _d['lmp_type'],
-                }
-                output.append(d)
-            except Exception, er:
-                """No logging implemented, but this is where we 
-                would handle errors from failed rows and log it.
-                """
-                self.rows_rejected += 1
-                pass
-        raw = pandas.DataFrame(output)
-        lmp = (raw[raw.lmp_type == 'LMP']
-               .rename(columns={'price': 'lmp'})
-               .set_index(['dt_utc','node'])
-               .drop(['lmp_type'], axis=1))
-        mcc = (raw[raw.lmp_type == 'MCC']
-               .rename(columns={'price': 'cong'})
-               .set_index(['dt_utc','node'])
-               .drop(['datatype', 'iso', 'lmp_type'], axis=1))
-        mlc = (raw[raw.lmp_type == 'MCL']
-               .rename(columns={'price': 'loss'})
-               .set_index(['dt_utc','node'])
-               .drop(['datatype', 'iso', 'lmp_type'], axis=1))
-        mce = (raw[raw.lmp_type == 'MCE']
-               .rename(columns={'price': 'energy'})
-               .set_index(['dt_utc','node'])
-               .drop(['datatype', 'iso', 'lmp_type'], axis=1))
-        
-        joined = (lmp
-            .join(mcc, how='left', lsuffix='_left', rsuffix='_right')
-            .join(mlc, how='left', lsuffix='_left', rsuffix='_right')
-            .join(mce, how='left', lsuffix='_left', rsuffix='_right')
-            .reset_index(level=['dt_utc', 'node'])
-            .sort_values(by=['node','dt_utc'])
-            .reset_index())
-        
-        self.rows_accepted = len(joined)
-        cols_ordered = [
-            'datatype','iso','node','dt_utc'
-            ,'energy','cong','loss','lmp',
-        ]
-        self.data = joined[cols_ordered]
+        archive = zipfile.ZipFile(self.run_stage('get_file', self.open_raw))
+        if len(archive.namelist()) == 1:
+            self.filename = archive.namelist()[0][:-3] + 'zip'
+        raw = pandas.concat([self._load_raw(self.select_nodes(chunk)) 
+            for f in archive.namelist()
+            for chunk in self.read_frame(archive.open(f), chunksize=chunksize)
+        ], ignore_index=True)
+        data = self.run_stage('load_frame', self._join_components, raw)
+        self.report_rows()
+        for i in range(0, len(data), chunksize):
+            yield data[i:i+chunksize]
+    
+    def load_frame(self, i_frame):
+        """This method accepts a DataFrame of the raw csv columns and 
+        it returns a Pandas DataFrame. 
+        """
+        return self._join_components(self._load_raw(i_frame))
+    
+    def load_chunk(self, i_frame):
+        """Overrides Superclass method. The components of a node can 
+        sit in any chunk, so chunks only go as far as the raw long 
+        format.
+        """
+        return self._load_raw(i_frame)
+    
+    def merge_chunks(self, i_frames):
+        """Overrides Superclass method. Joins the components of the 
+        raw long format of every chunk.
+        """
+        return self._join_components(
+            pandas.concat(i_frames, ignore_index=True))
+    
+    def _load_raw(self, i_frame):
+        """This method reduces the raw csv columns to one price per 
+        node, interval and lmp_type.
+        """
+        price_col = self.config['price_col']
+        i_frame.columns = [x.strip().lower() for x in i_frame]
+        price = pandas.to_numeric(i_frame[price_col], errors='coerce')
+        dt_utc = pandas.to_datetime(i_frame['intervalstarttime_gmt'], 
+            format='%Y-%m-%dT%H:%M:%S-00:00', errors='coerce')
+        valid = self.filter_rows([
+            ('price is not a number',       price.isnull()),
+            ('bad interval start time',     dt_utc.isnull()),
+            ('missing node',                i_frame['node'].isnull()),
+            ('missing lmp_type',            i_frame['lmp_type'].isnull()),
+        ])
+        raw = pandas.DataFrame({
+            'node':         i_frame.loc[valid, 'node']
+                                .astype(str).str.upper(),
+            'dt_utc':       dt_utc[valid],
+            'price':        price[valid],
+            'lmp_type':     i_frame.loc[valid, 'lmp_type'].str.upper(),
+        })
+        return raw
+    
+    def _join_components(self, raw):
+        """This method reshapes the LMP, MCC, MCL and MCE rows of the 
+        raw long format into the Atlas LMP columns.
+        """
+        joined = pivot_components(raw, self.lmp_components, 
+            self.datatype, self.iso, i_filter_rows=self.filter_rows)
+        self.rows_accepted += len(joined)
+        self.data = joined
         return self.data
 
+    @classmethod
+    def build_urls(cls, **kwargs):
+        """This class method splits the startdate to enddate range 
+        into the largest windows OASIS serves in one query of the 
+        datatype and returns the url of each, in date order. It takes 
+        the same args as build_url."""
+        config_dict = datatypes.get_config(cls.iso, kwargs.get('datatype'))
+        if kwargs.get('pnode'):
+            days = config_dict['max_days_pnode']
+        else:
+            days = config_dict['max_days']
+        start = kwargs.get('startdate')
+        end = kwargs.get('enddate') or start + datetime.timedelta(days=1)
+        urls = []
+        while start < end:
+            stop = min(start + datetime.timedelta(days=days), end)
+            urls.append(CaisoLmp.build_url(**dict(kwargs, 
+                startdate=start, enddate=stop)))
+            start = stop
+        return urls
+    
     @classmethod
     def build_url(cls, **kwargs):
         """This class method builds a url from the startdate, 
-        enddate, pnode, datatype arg."""
-        meta = CaisoLmp.datatype_config()
-        config_dict = [d for d in meta if 
-            d['atlas_datatype'] == kwargs.get('datatype')][0]
+        enddate, pnode, datatype arg. Without an enddate the query is 
+        one day long. A startdatetime and enddatetime in UTC narrow 
+        the query to part of a day instead."""
+        config_dict = datatypes.get_config(cls.iso, kwargs.get('datatype'))
         try:
             startdate = kwargs.get('date').strftime('%Y%m%d')
         except Exception, er:
-            startdate = kwargs.get('startdate').strftime('%Y%m%d')
+            startdate = kwargs.get('startdate', 
+                kwargs.get('startdatetime')).strftime('%Y%m%d')
             pass
         # filter pnode constructor
+        pnode_url = ''
         if kwargs.get('pnode'):
-            try:
-                pnode_url = '&node={0}'.format(kwargs.get('pnode'))
-                enddate = kwargs.get('enddate').strftime('%Y%m%d')
-            except AttributeError:
-                enddate = (datetime.datetime.strptime(startdate, '%Y%m%d') 
-                    + datetime.timedelta(days=1)).strftime('%Y%m%d')
-                print 'enddate set to {0}'.format(enddate)
-        else:
-            pnode_url = ''
-            enddate = (datetime.strptime(startdate, '%Y%m%d') 
+            pnode_url = '&node={0}'.format(kwargs.get('pnode'))
+        try:
+            enddate = kwargs.get('enddate').strftime('%Y%m%d')
+        except AttributeError:
+            enddate = (datetime.datetime.strptime(startdate, '%Y%m%d') 
                 + datetime.timedelta(days=1)).strftime('%Y%m%d')
+            if kwargs.get('pnode'):
+                print 'enddate set to {0}'.format(enddate)
+        start = startdate + 'T07:00-0000'
+        end = enddate + 'T07:00-0000'
+        if kwargs.get('startdatetime'):
+            start = kwargs.get('startdatetime').strftime('%Y%m%dT%H:%M-0000')
+        if kwargs.get('enddatetime'):
+            end = kwargs.get('enddatetime').strftime('%Y%m%dT%H:%M-0000')
         url = 'http://oasis.caiso.com/oasisapi/SingleZip?queryname='
-        url += '{0}&startdatetime={1}T07:00-0000'.format(
+        url += '{0}&startdatetime={1}'.format(
             # add the appropriate xml_name for the datatype
             config_dict['xml_name'],
-            startdate)
-        url += '&enddatetime={0}T07:00-0000&market_run_id={1}'.format(
-            enddate,
+            start)
+        url += '&enddatetime={0}&market_run_id={1}'.format(
+            end,
             config_dict['market'])
         url += '&resultformat=6&version=1' + pnode_url
         return url
@@ -212,54 +257,91 @@ class CaisoLmp(BaseCollectEvent):
     @classmethod
     def _get_datatype_from_url(cls, **kwargs):
         """This class method finds the datatype for a given url."""
-        meta = CaisoLmp.datatype_config()
         url = kwargs.get('url')
-        conf = [i for i in meta if i['xml_name'] in url][0]
-        return conf['atlas_datatype']
+        return CaisoLmp._get_config_from_url(url)['atlas_datatype']
+    
+    @classmethod
+    def _get_config_from_url(cls, url):
+        """This class method finds the datatype config for a given url 
+        by its queryname."""
+        return datatypes.find_config(cls.iso, _get_query(url)['queryname'])
     
     @classmethod
     def datatype_config(cls):
         """This class method maps the Atlas datatype to CAISO 
         API fields."""
-        config = [
-            {
-                'atlas_datatype':       'HALMP_PRC', # failing multi-day test
-                'xml_name':             'PRC_HASP_LMP',
-                'market':               'HASP',
-                'xml_data_items':       [
-                                            'LMP_CONG_PRC', 'LMP_ENE_PRC',
-                                            'LMP_LOSS_PRC', 'LMP_PRC',
-                                            'LMP_GHG_PRC',
-                                        ],
-                'lmp_component_split':  True,
-                'price_col':           'mw',
-                'singlezip':           True,
-                'filename':             '_HASP_LMP_GRP_N_N_v1_csv.zip',
-            },{
-                'atlas_datatype':       'RTLMP_RTPD',
-                'xml_name':             'PRC_RTPD_LMP',
-                'market':               'RTPD',
-                'xml_data_items':       [
-                                            'LMP_CONG_PRC', 'LMP_ENE_PRC',
-                                            'LMP_LOSS_PRC', 'LMP_PRC',
-                                            'LMP_GHG_PRC',
-                                        ],
-                'lmp_component_split':  True,
-                'price_col':           'prc',
-                'singlezip':           True,
-                'filename':             '_RTPD_LMP_GRP_N_N_v1_csv.zip',
-            },{
-                'atlas_datatype':       'DALMP_PRC',
-                'xml_name':             'PRC_LMP',
-                'market':               'DAM',
-                'xml_data_items':       [
-                                            'LMP_CONG_PRC', 'LMP_ENE_PRC',
-                                            'LMP_LOSS_PRC', 'LMP_PRC',
-                                        ],
-                'lmp_component_split':  True,
-                'price_col':            'mw',
-                'singlezip':            False,
-                'filename':             '_DAM_LMP_GRP_N_N_v1_csv.zip',
-            }
-        ]
-        return config
\ No newline at end of file
+        return datatypes.get_configs(cls.iso)
+
+
+# CAISO datatype configs, looked up through atlas.energy.datatypes
+DATATYPE_CONFIG = [
+    {
+        'atlas_datatype':       'HALMP_PRC', # failing multi-day test
+        'xml_name':             'PRC_HASP_LMP',
+        'market':               'HASP',
+        'xml_data_items':       [
+                                    'LMP_CONG_PRC', 'LMP_ENE_PRC',
+                                    'LMP_LOSS_PRC', 'LMP_PRC',
+                                    'LMP_GHG_PRC',
+                                ],
+        'lmp_component_split':  True,
+        'price_col':           'mw',
+        'singlezip':           True,
+        'filename':             '_HASP_LMP_GRP_N_N_v1_csv.zip',
+        'max_days':             1,
+        'max_days_pnode':       1,
+    },{
+        'atlas_datatype':       'RTLMP_RTPD',
+        'xml_name':             'PRC_RTPD_LMP',
+        'market':               'RTPD',
+        'xml_data_items':       [
+                                    'LMP_CONG_PRC', 'LMP_ENE_PRC',
+                                    'LMP_LOSS_PRC', 'LMP_PRC',
+                                    'LMP_GHG_PRC',
+                                ],
+        'lmp_component_split':  True,
+        'price_col':           'prc',
+        'singlezip':           True,
+        'filename':             '_RTPD_LMP_GRP_N_N_v1_csv.zip',
+        'max_days':             1,
+        'max_days_pnode':       31,
+    },{
+        'atlas_datatype':       'DALMP_PRC',
+        'xml_name':             'PRC_LMP',
+        'market':               'DAM',
+        'xml_data_items':       [
+                                    'LMP_CONG_PRC', 'LMP_ENE_PRC',
+                                    'LMP_LOSS_PRC', 'LMP_PRC',
+                                ],
+        'lmp_component_split':  True,
+        'price_col':            'mw',
+        'singlezip':            False,
+        'filename':             '_DAM_LMP_GRP_N_N_v1_csv.zip',
+        'max_days':             1,
+        'max_days_pnode':       31,
+    }
+]
+datatypes.register(CaisoLmp.iso, DATATYPE_CONFIG, 'xml_name')
+
+def _wait_for_oasis():
+    """This function blocks until the next OASIS request may start, 
+    OASIS_REQUEST_INTERVAL seconds after the start of the last one.
+    """
+    global _oasis_next
+    with _oasis_lock:
+        now = time.time()
+        wait = _oasis_next - now
+        _oasis_next = max(now, _oasis_next) + OASIS_REQUEST_INTERVAL
+    if wait > 0:
+        time.sleep(wait)
+
+
+def _get_query(i_url):
+    """This function returns the query string args of i_url as a dict 
+    of strings.
+    """
+    query = urlparse.urlsplit(i_url).query
+    if '%' in query or '+' in query:
+        return dict(urlparse.parse_qsl(query))
+    # the urls build_url makes need no unquoting, which is most of the cost
+    return dict(arg.partition('=')[::2] for arg in query.split('&'))
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+        atlas.energy.datatypes
+        ~~~~~~~~~~~~~~
+        This file provides the registry of ISO datatype metadata. Each
+        collector module registers its datatype configs once at import,
+        and lookups by Atlas datatype or by the key that identifies the
+        datatype in a url are then dict lookups instead of list scans.
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+
+# configs by ISO, in registration order
+_configs = {}
+# configs by (ISO, atlas_datatype)
+_by_datatype = {}
+# configs by (ISO, url key)
+_by_url_key = {}
+
+
+def register(iso, configs, url_field):
+    """This function registers the datatype configs of iso. The
+    url_field of each config is the key that identifies its datatype
+    in a url, e.g. the CAISO queryname.
+    """
+    _configs[iso] = configs
+    for config in configs:
+        _by_datatype[(iso, config['atlas_datatype'])] = config
+        _by_url_key[(iso, config[url_field])] = config
+
+
+def get_configs(iso):
+    """This function returns the list of datatype configs of iso."""
+    return _configs[iso]
+
+
+def get_config(iso, datatype):
+    """This function returns the config of an Atlas datatype of iso."""
+    try:
+        return _by_datatype[(iso, datatype)]
+    except KeyError:
+        raise ValueError('{0} has no datatype {1}'.format(iso, datatype))
+
+
+def find_config(iso, url_key):
+    """This function returns the config of the iso datatype that
+    url_key identifies.
+    """
+    try:
+        return _by_url_key[(iso, url_key)]
+    except KeyError:
+        raise ValueError('{0} has no datatype for {1}'.format(iso, url_key))
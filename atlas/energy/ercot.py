@@ -14,51 +14,62 @@
 import sys
 import datetime
 import zipfile
-import StringIO
 
-import pandas
-import requests
-import pytz
+from atlas import BaseCollectEvent, tz
+from atlas.energy.lmp import set_lmp_dtypes
+from atlas.lazy import LazyModule
 
-from atlas import BaseCollectEvent
+numpy = LazyModule('numpy')
+pandas = LazyModule('pandas')
 
 
 class BaseErcot(BaseCollectEvent):
     """This is the Super Class for all ERCOT LMP collector classes."""
     
+    iso = 'ERCOT'
+    verify_ssl = True
+    
+    # keep every field as the raw string instead of inferring types
+    read_as_str = False
+    
     def __init__(self, **kwargs):
-        BaseCollectEvent.__init__(self)
+        BaseCollectEvent.__init__(self, **kwargs)
         
     def get_file(self):
         """This method overrides the superclass method. This method 
         generates a GET request on the self.url resource. It returns a 
-        ZipFile file object.
+        ZipFile file object and keeps it in self.fileobject.
         """
-        r = requests.get(self.url, stream=True)
-        return zipfile.ZipFile(StringIO.StringIO(r.content))
+        self.fileobject = zipfile.ZipFile(self.open_raw())
+        return self.fileobject
     
     def extract_file(self, i_filedata):
-        """Overrides Superclass method. Open zipfile and return 
-        StringIO file-like object.
+        """Overrides Superclass method. Returns the member chosen by 
+        open_member as a file object that decompresses as it is read.
         """
-        output = StringIO.StringIO()
-        # override filename attr if only one file in archive
-        self.filename = i_filedata.namelist()[0] + '.zip'
-        output.write(i_filedata.read(self.filename[:-4]))
-        output.seek(0)
-        return output
+        return self.open_member(i_filedata)
     
-    def get_data(self):
-        """This method overrides the superclass method. This method 
-        generates a GET request on the self.url resource, unzips the 
-        file, and parses it into a Pandas DataFrame.
+    def open_member(self, i_zipfile):
+        """Overrides Superclass method. ERCOT archives carry the csv 
+        as their first member.
         """
-        self.fileobject = self.get_file()
-        unzipped = self.extract_file(self.fileobject)
-        csvstr = unzipped.read()
-        payload = self.load_data(self.get_csv_list_from_str(csvstr))
-        del unzipped
-        return payload
+        self.filename = i_zipfile.namelist()[0] + '.zip'
+        return i_zipfile.open(self.filename[:-4])
+    
+    def read_frame(self, i_fileobject, **kwargs):
+        """Overrides Superclass method. Classes with read_as_str set 
+        get every column back as a string with blanks left as ''.
+        """
+        if self.read_as_str:
+            kwargs.update(dtype=str, keep_default_na=False)
+        return BaseCollectEvent.read_frame(self, i_fileobject, **kwargs)
+    
+    def open_csv(self):
+        """Overrides Superclass method. The csv text is the archive 
+        member chosen by open_member.
+        """
+        return self.run_stage('extract_file', self.extract_file, 
+            self.fileobject)
     
     @classmethod
     def get_const_cols(cls):
@@ -74,46 +85,48 @@ class ErcotDaLmp(BaseErcot):
     """This is the generic LMP Class for ERCOT. Right now we only 
     collect the ERCOT LMP data in daily increments."""
     
+    node_col = 'SettlementPoint'
+    
     def __init__(self, **kwargs):
-        BaseErcot.__init__(self)
+        BaseErcot.__init__(self, **kwargs)
         self.url = kwargs.get('url')
         self.datatype = 'DALMP'
     
-    def load_data(self, i_csv_list):
-        output = []
-        headers = i_csv_list[0]
-        print headers
-        localtz = pytz.timezone('America/Chicago')
-        for row in i_csv_list[1:]:
-            _d = dict(zip(
-                [h.lower() for h in headers], [x.upper() for x in row]))
-            try:
-                dt = (localtz.localize(datetime.datetime
-                    .strptime(
-                        '{0} {1}'.format(
-                            _d['deliverydate'],
-                            _d['deliveryhour']),
-                        '%m/%d/%Y %H:%M')).astimezone(pytz.timezone('UTC'))
-                + datetime.timedelta(hours=-1))
-                d = {
-                    'datatype':     self.datatype,
-                    'iso':          'ERCOT',
-                    'node':         _d['settlementpoint'],
-                    'dt_utc':       dt,
-                    'energy':       '',
-                    'cong':         '',
-                    'loss':         '',
-                    'lmp':          float(_d['settlementpointprice']),
-                }
-                output.append(d)
-            except Exception, er:
-                print er
-                pass
-        cols_ordered = [
-            'datatype','iso','node','dt_utc'
-            ,'energy','cong','loss','lmp',
-        ]
-        self.data = pandas.DataFrame(output)[cols_ordered]
+    def load_frame(self, i_frame):
+        """This method accepts a DataFrame of the raw csv columns and 
+        it returns a Pandas DataFrame. 
+        """
+        i_frame.columns = [h.strip().lower() for h in i_frame]
+        date = pandas.to_datetime(i_frame['deliverydate'], 
+            format='%m/%d/%Y', errors='coerce')
+        hour = pandas.to_numeric(
+            i_frame['deliveryhour'].astype(str).str.split(':').str[0], 
+            errors='coerce')
+        price = pandas.to_numeric(
+            i_frame['settlementpointprice'], errors='coerce')
+        valid = self.filter_rows([
+            ('bad delivery date',       date.isnull()),
+            ('bad delivery hour',       hour.isnull()),
+            ('price is not a number',   price.isnull()),
+            ('missing settlement point', 
+                i_frame['settlementpoint'].isnull()),
+        ])
+        local = date[valid] + pandas.to_timedelta(hour[valid], unit='h')
+        output = pandas.DataFrame({
+            'node':         i_frame.loc[valid, 'settlementpoint']
+                                .astype(str).str.upper(),
+            'dt_utc':       tz.to_utc(local, 'America/Chicago')
+                                + datetime.timedelta(hours=-1),
+            'lmp':          price[valid],
+        })
+        output['datatype'] = self.datatype
+        output['iso'] = self.iso
+        # ERCOT publishes no LMP components
+        output['energy'] = float('nan')
+        output['cong'] = float('nan')
+        output['loss'] = float('nan')
+        self.rows_accepted += len(output)
+        self.data = set_lmp_dtypes(output, self.iso)
         return self.data
 
 
@@ -121,46 +134,51 @@ class ErcotRtLmp(BaseErcot):
     """This is the generic LMP Class for ERCOT. Right now we only 
     collect the ERCOT LMP data in daily increments."""
     
+    node_col = 'SettlementPointName'
+    
     def __init__(self, **kwargs):
-        BaseErcot.__init__(self)
+        BaseErcot.__init__(self, **kwargs)
         self.url = kwargs.get('url')
         self.datatype = 'RTLMP'
     
-    def load_data(self, i_csv_list):
-        output = []
-        headers = i_csv_list[0]
-        print [h.lower() for h in headers]
-        localtz = pytz.timezone('America/Chicago')
-        for row in i_csv_list[1:]:
-            _d = dict(zip(
-                [h.lower() for h in headers], [x.upper() for x in row]))
-            try:
-                dt = (localtz.localize(datetime.datetime
-                    .strptime(
-                        '{0} {1}:{2}'.format(
-                            _d['deliverydate'],
-                            _d['deliveryhour'],
-                            (int(_d['deliveryinterval'])%4)*15),
-                        '%m/%d/%Y %H:%M')).astimezone(pytz.timezone('UTC'))
-                    + datetime.timedelta(hours=-1))
-                d = {
-                    'datatype':     self.datatype,
-                    'iso':          'ERCOT',
-                    'node':         _d['settlementpointname'],
-                    'dt_utc':       dt,
-                    'energy':       '',
-                    'cong':         '',
-                    'loss':         '',
-                    'lmp':          float(_d['settlementpointprice']),
-                }
-                output.append(d)
-            except Exception, er:
-                pass
-        cols_ordered = [
-            'datatype','iso','node','dt_utc'
-            ,'energy','cong','loss','lmp',
-        ]
-        self.data = pandas.DataFrame(output)[cols_ordered]
+    def load_frame(self, i_frame):
+        """This method accepts a DataFrame of the raw csv columns and 
+        it returns a Pandas DataFrame. 
+        """
+        i_frame.columns = [h.strip().lower() for h in i_frame]
+        date = pandas.to_datetime(i_frame['deliverydate'], 
+            format='%m/%d/%Y', errors='coerce')
+        hour = pandas.to_numeric(i_frame['deliveryhour'], errors='coerce')
+        interval = pandas.to_numeric(
+            i_frame['deliveryinterval'], errors='coerce')
+        price = pandas.to_numeric(
+            i_frame['settlementpointprice'], errors='coerce')
+        valid = self.filter_rows([
+            ('bad delivery date',       date.isnull()),
+            ('bad delivery hour',       hour.isnull()),
+            ('bad delivery interval',   interval.isnull()),
+            ('price is not a number',   price.isnull()),
+            ('missing settlement point', 
+                i_frame['settlementpointname'].isnull()),
+        ])
+        local = (date[valid] 
+            + pandas.to_timedelta(hour[valid], unit='h')
+            + pandas.to_timedelta((interval[valid]%4)*15, unit='m'))
+        output = pandas.DataFrame({
+            'node':         i_frame.loc[valid, 'settlementpointname']
+                                .astype(str).str.upper(),
+            'dt_utc':       tz.to_utc(local, 'America/Chicago')
+                                + datetime.timedelta(hours=-1),
+            'lmp':          price[valid],
+        })
+        output['datatype'] = self.datatype
+        output['iso'] = self.iso
+        # ERCOT publishes no LMP components
+        output['energy'] = float('nan')
+        output['cong'] = float('nan')
+        output['loss'] = float('nan')
+        self.rows_accepted += len(output)
+        self.data = set_lmp_dtypes(output, self.iso)
         return self.data
 
 
@@ -168,188 +186,228 @@ class ErcotSced(BaseErcot):
     """This is the generic LMP Class for ERCOT. Right now we only 
     collect the ERCOT LMP data in daily increments."""
     
+    # curve name, output column prefix and number of points
+    curves = [('SCED1', 'sced1_', 35), ('SCED2', 'sced2_', 35), 
+        ('TPO', 'tpo_', 10)]
+    
     def __init__(self, **kwargs):
-        BaseErcot.__init__(self)
+        BaseErcot.__init__(self, **kwargs)
         self.url = kwargs.get('url')
         self.datatype = 'SCED_GEN'
     
-    def extract_file(self, i_filedata):
-        """Overrides Superclass method. Open zipfile and return 
-        StringIO file-like object.
+    def open_member(self, i_zipfile):
+        """Overrides Superclass method. Opens the generation resource 
+        member of the 60-day disclosure archive.
         """
-        output = StringIO.StringIO()
-        # override filename attr if only one file in archive
-        self.filename = [i for i in i_filedata.namelist() if 
+        self.filename = [i for i in i_zipfile.namelist() if 
             '60d_SCED_Gen_Resource_Data-' in i][0]
-        output.write(i_filedata.read(self.filename))
-        output.seek(0)
-        return output
+        return i_zipfile.open(self.filename)
+    
+    def read_frame(self, i_fileobject, **kwargs):
+        """Overrides Superclass method. Only the columns the output is 
+        built from are parsed, and numbers are parsed as numbers.
+        """
+        raw = set([c for o, c, t in ErcotSced.get_sced_cols()])
+        raw.add('sced time stamp')
+        kwargs.setdefault('usecols', lambda c: c.strip().lower() in raw)
+        return BaseErcot.read_frame(self, i_fileobject, **kwargs)
+    
+    @classmethod
+    def get_sced_cols(cls):
+        """This class method maps each output column to its raw csv 
+        column and the dtype it is stored as: MW and prices as 
+        float32, the repeated strings as categoricals.
+        """
+        cols = [
+            ('resource_name',       'resource name',            'category'),
+            ('resource_type',       'resource type',            'category'),
+            ('output_schedule',     'output schedule',          'float32'),
+            ('hsl',                 'hsl',                      'float32'),
+            ('hasl',                'hasl',                     'float32'),
+            ('hdl',                 'hdl',                      'float32'),
+            ('lsl',                 'lsl',                      'float32'),
+            ('lasl',                'lasl',                     'float32'),
+            ('ldl',                 'ldl',                      'float32'),
+            ('tele_resource_status', 'telemetered resource status', 
+                                                        'category'),
+            ('base_point',          'base point',               'float32'),
+            ('tele_net_output',     'telemetered net output',   'float32'),
+            ('as_regup',            'ancillary service regup',  'float32'),
+            ('as_regdown',          'ancillary service regdn',  'float32'),
+            ('as_rrs',              'ancillary service rrs',    'float32'),
+            ('as_nsrs',             'ancillary service nsrs',   'float32'),
+            ('bid_type',            'bid_type',                 'category'),
+            ('startup_cold_offer',  'start up cold offer',      'float32'),
+            ('startup_hot_offer',   'start up hot offer',       'float32'),
+            ('startup_inter_offer', 'start up inter offer',     'float32'),
+            ('min_gen_cost',        'min gen cost',             'float32'),
+            ('proxy_ext',           'proxy extension',          'category'),
+        ]
+        return cols + cls._proc_sced_curves()
     
     @classmethod
-    def _proc_sced_curves(cls, i_dict, o_dict):
+    def _proc_sced_curves(cls):
         """Helper method so we don't have to write the same thing 
         70 times.
         """
+        cols = []
         for sced in [1,2]:
             for i in range(1,36):
-                key_mw = 'sced{0}_mw{1}'.format(sced, i)
-                key_price = 'sced{0}_price{1}'.format(sced, i)
-                o_dict[key_mw] = i_dict['sced{0} curve-mw{1}'.format(sced, i)]
-                o_dict[key_price] = i_dict[
-                    'sced{0} curve-price{1}'.format(sced, i)
-                ]
+                cols.append(('sced{0}_mw{1}'.format(sced, i), 
+                    'sced{0} curve-mw{1}'.format(sced, i), 'float32'))
+                cols.append(('sced{0}_price{1}'.format(sced, i), 
+                    'sced{0} curve-price{1}'.format(sced, i), 'float32'))
         for tpo in range(1,11):
-            key_mw = 'tpo_mw{0}'.format(tpo)
-            key_price = 'tpo_price{0}'.format(tpo)
-            o_dict[key_mw] = i_dict['submitted tpo-mw{0}'.format(tpo)]
-            o_dict[key_price] = i_dict['submitted tpo-price{0}'.format(tpo)]
-        return o_dict
+            cols.append(('tpo_mw{0}'.format(tpo), 
+                'submitted tpo-mw{0}'.format(tpo), 'float32'))
+            cols.append(('tpo_price{0}'.format(tpo), 
+                'submitted tpo-price{0}'.format(tpo), 'float32'))
+        return cols
             
-    def load_data(self, i_csv_list):
-        output = []
-        headers = [i.lower().strip().replace('"','') for i in i_csv_list[0]]
-        localtz = pytz.timezone('America/Chicago')
-        for row in i_csv_list[1:]:
-            _d = dict(
-                zip(
-                    [h.lower().strip().replace('"','') for h in headers],
-                    [x.upper().strip().replace('"','') for x in row]
-                )
-            )
-            try:
-                dt = (localtz.localize(datetime.datetime
-                    .strptime(_d['sced time stamp'],'%m/%d/%Y %H:%M:%S'))
-                    .astimezone(pytz.timezone('UTC')))
-                    
-                d = {
-                    'datatype':             self.datatype,
-                    'iso':                  'ERCOT',
-                    'dt_utc':               dt,
-                    'resource_name':        _d['resource name'],
-                    'resource_type':        _d['resource type'],
-                    'output_schedule':      _d['output schedule'],
-                    'hsl':                  _d['hsl'],
-                    'hasl':                 _d['hasl'],
-                    'hdl':                  _d['hdl'],
-                    'lsl':                  _d['lsl'],
-                    'lasl':                 _d['lasl'],
-                    'ldl':                  _d['ldl'],
-                    'tele_resource_status': _d['telemetered resource status'],
-                    'base_point':           _d['base point'],
-                    'tele_net_output':      _d['telemetered net output'],
-                    'as_regup':             _d['ancillary service regup'],
-                    'as_regdown':           _d['ancillary service regdn'],
-                    'as_rrs':               _d['ancillary service rrs'],
-                    'as_nsrs':              _d['ancillary service nsrs'],
-                    'bid_type':             _d['bid_type'],
-                    'startup_cold_offer':   _d['start up cold offer'],
-                    'startup_hot_offer':    _d['start up hot offer'],
-                    'startup_inter_offer':  _d['start up inter offer'],
-                    'min_gen_cost':         _d['min gen cost'],
-                    'proxy_ext':            _d['proxy extension'],
-                }
-                d = ErcotSced._proc_sced_curves(_d, d)
-                output.append(d)
-            except Exception, er:
-                print er
-                pass
-        self.data = pandas.DataFrame(output)
+    def load_frame(self, i_frame):
+        """This method accepts a DataFrame of the raw csv columns and 
+        it returns a Pandas DataFrame. 
+        """
+        i_frame.columns = [h.lower().strip() for h in i_frame]
+        dt = pandas.to_datetime(i_frame['sced time stamp'], 
+            format='%m/%d/%Y %H:%M:%S', errors='coerce')
+        valid = self.filter_rows([('bad timestamp', dt.isnull())])
+        if not valid.all():
+            i_frame = i_frame[valid]
+        d = {
+            'datatype':     self.datatype,
+            'iso':          self.iso,
+            'dt_utc':       tz.to_utc(dt[valid], 'America/Chicago'),
+        }
+        for col, raw, dtype in ErcotSced.get_sced_cols():
+            if dtype == 'category':
+                d[col] = (i_frame[raw].fillna('').astype(str)
+                    .str.strip().str.upper().astype('category'))
+            else:
+                d[col] = pandas.to_numeric(
+                    i_frame[raw], errors='coerce').astype(dtype)
+        cols_ordered = ['datatype','iso','dt_utc'] + [
+            c for c, r, t in ErcotSced.get_sced_cols()]
+        self.data = pandas.DataFrame(d, columns=cols_ordered)
+        self.rows_accepted += len(self.data)
         return self.data
+    
+    @classmethod
+    def melt_curves(cls, i_frame):
+        """This class method returns the offer curves of a SCED output 
+        frame in long format, one row per resource_name, dt_utc, curve 
+        and point with its mw and price. Points with neither are left 
+        out, so short curves take no room. Drop the curve columns from 
+        the wide frame with get_curve_cols when only this is kept.
+        """
+        parts = []
+        for curve, prefix, points in cls.curves:
+            n = len(i_frame)
+            part = i_frame[['resource_name','dt_utc']].take(
+                numpy.repeat(numpy.arange(n), points))
+            part.reset_index(drop=True, inplace=True)
+            part['curve'] = pandas.Categorical([curve] * len(part), 
+                categories=[c[0] for c in cls.curves])
+            part['point'] = numpy.tile(
+                numpy.arange(1, points + 1, dtype='int8'), n)
+            for field in ('mw', 'price'):
+                part[field] = i_frame[['{0}{1}{2}'.format(prefix, field, i) 
+                    for i in range(1, points + 1)]].values.ravel()
+            parts.append(part[part['mw'].notnull() | part['price'].notnull()])
+        return (pandas.concat(parts, ignore_index=True)
+            .sort_values(['resource_name','dt_utc','curve','point'], 
+                kind='mergesort')
+            .reset_index(drop=True))
+    
+    @classmethod
+    def get_curve_cols(cls):
+        """This class method returns the wide curve columns that 
+        melt_curves folds into rows.
+        """
+        return [c for c, r, t in cls._proc_sced_curves()]
 
 
 class ErcotDaConstraint(BaseErcot):
     """This class is for ERCOT DA constraint and shadow price data."""
     
+    read_as_str = True
+    
     def __init__(self, **kwargs):
-        BaseErcot.__init__(self)
+        BaseErcot.__init__(self, **kwargs)
         self.url = kwargs.get('url')
         self.datatype = 'DA_CONSTRAINT'
         self.fileobject = self.get_file()
     
-    def load_data(self, i_csv_list):
-        output = []
-        headers = [i.lower().strip().replace('"','') for i in i_csv_list[0]]
-        localtz = pytz.timezone('America/Chicago')
-        for row in i_csv_list[1:]:
-            _d = dict(
-                zip(
-                    [h.lower().strip().replace('"','') for h in headers],
-                    [x.upper().strip().replace('"','') for x in row]
-                )
-            )
-            try:
-                dt = (localtz.localize(datetime.datetime
-                    .strptime(_d['deliverytime'],'%m/%d/%Y %H:%M:%S'))
-                    .astimezone(pytz.timezone('UTC')))
-                d = {
-                    'datatype':             self.datatype,
-                    'iso':                  'ERCOT',
-                    'dt_utc':               dt,
-                    'constraint_id':        _d['constraintid'],
-                    'constraint_name':      _d['constraintname'],
-                    'contingency_name':     _d['contingencyname'],
-                    'shadow_price':         _d['shadowprice'],
-                    'max_shadow_price':     '',
-                    'constraint_limit':     _d['constraintlimit'],
-                    'constraint_value':     _d['constraintvalue'],
-                    'violation_amount':     _d['violationamount'],
-                    'from_station':         _d['fromstation'],
-                    'to_station':           _d['tostation'],
-                    'from_station_kv':      _d['fromstationkv'],
-                    'to_station_kv':        _d['tostationkv'],
-                }
-                output.append(d)
-            except Exception, er:
-                print er
-                pass
-        self.data = pandas.DataFrame(output)[BaseErcot.get_const_cols()]
+    def load_frame(self, i_frame):
+        """This method accepts a DataFrame of the raw csv columns and 
+        it returns a Pandas DataFrame. 
+        """
+        i_frame.columns = [h.lower().strip() for h in i_frame]
+        dt = pandas.to_datetime(i_frame['deliverytime'], 
+            format='%m/%d/%Y %H:%M:%S', errors='coerce')
+        valid = self.filter_rows([('bad timestamp', dt.isnull())])
+        _d = i_frame[valid].apply(lambda x: x.str.strip().str.upper())
+        d = {
+            'datatype':             self.datatype,
+            'iso':                  self.iso,
+            'dt_utc':               tz.to_utc(
+                                        dt[valid], 'America/Chicago'),
+            'constraint_id':        _d['constraintid'],
+            'constraint_name':      _d['constraintname'],
+            'contingency_name':     _d['contingencyname'],
+            'shadow_price':         _d['shadowprice'],
+            'max_shadow_price':     '',
+            'constraint_limit':     _d['constraintlimit'],
+            'constraint_value':     _d['constraintvalue'],
+            'violation_amount':     _d['violationamount'],
+            'from_station':         _d['fromstation'],
+            'to_station':           _d['tostation'],
+            'from_station_kv':      _d['fromstationkv'],
+            'to_station_kv':        _d['tostationkv'],
+        }
+        self.data = pandas.DataFrame(d)[BaseErcot.get_const_cols()]
+        self.rows_accepted += len(self.data)
         return self.data
 
 
 class ErcotRtConstraint(BaseErcot):
     """This class is for ERCOT RT constraint and shadow price data."""
     
+    read_as_str = True
+    
     def __init__(self, **kwargs):
-        BaseErcot.__init__(self)
+        BaseErcot.__init__(self, **kwargs)
         self.url = kwargs.get('url')
         self.datatype = 'RT_CONSTRAINT'
         self.fileobject = self.get_file()
     
-    def load_data(self, i_csv_list):
-        output = []
-        headers = [i.lower().strip().replace('"','') for i in i_csv_list[0]]
-        localtz = pytz.timezone('America/Chicago')
-        for row in i_csv_list[1:]:
-            _d = dict(
-                zip(
-                    [h.lower().strip().replace('"','') for h in headers],
-                    [x.upper().strip().replace('"','') for x in row]
-                )
-            )
-            try:
-                dt = (localtz.localize(datetime.datetime
-                    .strptime(_d['scedtimestamp'],'%m/%d/%Y %H:%M:%S'))
-                    .astimezone(pytz.timezone('UTC')))
-                d = {
-                    'datatype':             self.datatype,
-                    'iso':                  'ERCOT',
-                    'dt_utc':               dt,
-                    'constraint_id':        _d['constraintid'],
-                    'constraint_name':      _d['constraintname'],
-                    'contingency_name':     _d['contingencyname'],
-                    'shadow_price':         _d['shadowprice'],
-                    'max_shadow_price':     _d['maxshadowprice'],
-                    'constraint_limit':     _d['limit'],
-                    'constraint_value':     _d['value'],
-                    'violation_amount':     _d['violatedmw'],
-                    'from_station':         _d['fromstation'],
-                    'to_station':           _d['tostation'],
-                    'from_station_kv':      _d['fromstationkv'],
-                    'to_station_kv':        _d['tostationkv'],
-                }
-                output.append(d)
-            except Exception, er:
-                print er
-                pass
-        self.data = pandas.DataFrame(output)[BaseErcot.get_const_cols()]
+    def load_frame(self, i_frame):
+        """This method accepts a DataFrame of the raw csv columns and 
+        it returns a Pandas DataFrame. 
+        """
+        i_frame.columns = [h.lower().strip() for h in i_frame]
+        dt = pandas.to_datetime(i_frame['scedtimestamp'], 
+            format='%m/%d/%Y %H:%M:%S', errors='coerce')
+        valid = self.filter_rows([('bad timestamp', dt.isnull())])
+        _d = i_frame[valid].apply(lambda x: x.str.strip().str.upper())
+        d = {
+            'datatype':             self.datatype,
+            'iso':                  self.iso,
+            'dt_utc':               tz.to_utc(
+                                        dt[valid], 'America/Chicago'),
+            'constraint_id':        _d['constraintid'],
+            'constraint_name':      _d['constraintname'],
+            'contingency_name':     _d['contingencyname'],
+            'shadow_price':         _d['shadowprice'],
+            'max_shadow_price':     _d['maxshadowprice'],
+            'constraint_limit':     _d['limit'],
+            'constraint_value':     _d['value'],
+            'violation_amount':     _d['violatedmw'],
+            'from_station':         _d['fromstation'],
+            'to_station':           _d['tostation'],
+            'from_station_kv':      _d['fromstationkv'],
+            'to_station_kv':        _d['tostationkv'],
+        }
+        self.data = pandas.DataFrame(d)[BaseErcot.get_const_cols()]
+        self.rows_accepted += len(self.data)
         return self.data
\ No newline at end of file
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+        atlas.energy.lmp
+        ~~~~~~~~~~~~~~
+        This file provides the LMP normalization shared by the ISO
+        collector classes.
+
+        The datatype, iso and node columns of every LMP output are
+        categoricals. Their categories come from one dictionary per
+        column, and per ISO for nodes, that only ever grows, so a node
+        keeps its code for the life of the process and frames of many
+        days concatenate without falling back to object columns.
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+import threading
+
+from atlas.lazy import LazyModule
+
+pandas = LazyModule('pandas')
+
+
+# the Atlas LMP output columns, in order
+LMP_COLUMNS = [
+    'datatype','iso','node','dt_utc'
+    ,'energy','cong','loss','lmp',
+]
+# dtype of the price columns; float32 halves them at ~7 digits
+PRICE_DTYPE = 'float64'
+
+_categories = {}
+_categories_lock = threading.Lock()
+
+
+def pivot_components(i_raw, i_components, i_datatype, i_iso,
+        i_index=('node','dt_utc'), i_filter_rows=None):
+    """This function reshapes the raw long format, one price per node,
+    interval and lmp_type, into the Atlas LMP columns in a single
+    unstack. i_components maps the ISO's lmp_type codes to the Atlas
+    column names, so CAISO's MCL and MISO's MLC both become 'loss';
+    other codes are ignored. Only the first price of a repeated node,
+    interval and lmp_type is kept; the others are rejected through
+    i_filter_rows, a collector's filter_rows, as 'duplicate interval'.
+    Rows without an LMP are dropped, and when the ISO does not publish
+    an energy component it is backed out of the others. The result is
+    sorted by i_index.
+    """
+    i_index = list(i_index)
+    raw = i_raw[i_raw['lmp_type'].isin(list(i_components))]
+    prices = raw.set_index(i_index + ['lmp_type'])['price']
+    if not prices.index.is_unique:
+        checks = [('duplicate interval', prices.index.duplicated())]
+        if i_filter_rows is not None:
+            prices = prices[i_filter_rows(checks)]
+        else:
+            prices = prices[~checks[0][1]]
+    wide = prices.unstack('lmp_type').sort_index()
+    wide.columns = [i_components[c] for c in wide.columns]
+    for c in ['energy','cong','loss','lmp']:
+        if c not in wide.columns:
+            wide[c] = float('nan')
+    wide = wide[wide['lmp'].notnull()].reset_index()
+    if 'energy' not in i_components.values():
+        wide['energy'] = wide['lmp'] - wide['cong'] - wide['loss']
+    wide['datatype'] = i_datatype
+    wide['iso'] = i_iso
+    return set_lmp_dtypes(wide, i_iso)
+
+
+def set_lmp_dtypes(i_frame, i_iso):
+    """This function returns the LMP_COLUMNS of i_frame with datatype, 
+    iso and node as categoricals from the shared dictionaries and the 
+    prices as PRICE_DTYPE. Blank prices become NaN.
+    """
+    for col, key in [('datatype', 'datatype'), ('iso', 'iso'), 
+            ('node', ('node', i_iso))]:
+        values = i_frame[col]
+        i_frame[col] = pandas.Categorical(values, 
+            categories=get_categories(key, values.unique()))
+    for col in ['energy','cong','loss','lmp']:
+        i_frame[col] = pandas.to_numeric(
+            i_frame[col], errors='coerce').astype(PRICE_DTYPE)
+    return i_frame[LMP_COLUMNS]
+
+
+def get_categories(i_key, i_values):
+    """This function adds the values not seen yet under i_key to its 
+    dictionary, in sorted order, and returns all categories of i_key.
+    """
+    with _categories_lock:
+        categories, index = _categories.setdefault(i_key, ([], {}))
+        for value in sorted(v for v in i_values if v not in index):
+            index[value] = len(categories)
+            categories.append(value)
+        return list(categories)
+
+
+def concat_frames(i_frames):
+    """This function concatenates DataFrames like pandas.concat, but 
+    first gives every categorical column the union of its categories 
+    across the frames, so the result stays categorical. Frames built 
+    in one process already share them and are only recoded when 
+    another process, or the frame cache, added categories.
+    """
+    frames = list(i_frames)
+    if not frames:
+        return pandas.DataFrame()
+    for col in frames[0].columns:
+        if str(frames[0][col].dtype) != 'category':
+            continue
+        union = []
+        seen = set()
+        for frame in frames:
+            for value in frame[col].cat.categories:
+                if value not in seen:
+                    seen.add(value)
+                    union.append(value)
+        for i, frame in enumerate(frames):
+            if len(frame[col].cat.categories) != len(union) or (
+                    list(frame[col].cat.categories) != union):
+                frames[i] = frame.assign(**{
+                    col: frame[col].cat.set_categories(union)})
+    return pandas.concat(frames, ignore_index=True)
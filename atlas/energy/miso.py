@@ -15,90 +15,120 @@
 import zipfile
 import datetime
 
-import pandas
-import pytz
+from atlas import BaseCollectEvent, tz
+from atlas.energy import datatypes
+from atlas.energy.lmp import pivot_components
+from atlas.lazy import LazyModule
 
-from atlas import BaseCollectEvent
+pandas = LazyModule('pandas')
+
+
+# MISO hours ending are Eastern Standard Time all year; the Etc zones
+# have their sign inverted, so this is UTC-5 without DST
+MARKET_TZ = 'Etc/GMT+5'
 
 
 class MisoLmp(BaseCollectEvent):
     """This is the Super Class for all MISO LMP collector classes."""
     
+    iso = 'MISO'
+    # MISO lmp_type codes; energy is backed out of the other three
+    lmp_components = {'LMP': 'lmp', 'MCC': 'cong', 'MLC': 'loss'}
+    # the LMP, MCC and MLC rows of a node are joined together
+    stream_group = 'Node'
+    node_col = 'Node'
+    
     def __init__(self, **kwargs):
-        BaseCollectEvent.__init__(self)
+        BaseCollectEvent.__init__(self, **kwargs)
         self.url = kwargs.get('url')
         self.filename = self.url.split('/')[-1]
-        
-        self.rows_rejected = 0
-        self.rows_accepted = 0
+        self.datatype = MisoLmp._get_datatype_from_url(url=self.url)
 
-    def load_data(self, i_csv_list):
-        """This method accepts a list of lists representing the csv
-        file and it returns a Pandas DataFrame. 
+    def get_delivery_date(self):
+        """Overrides Superclass method. MISO file names start with the 
+        delivery date.
         """
-        # all times are in EPT but watch out for DST issues
-        localtz = pytz.timezone('America/New_York')
-        
-        # find actual header row
-        r = [x for x in i_csv_list if x[0] == 'Node'][0]
-        # clean is the csv file without the top few rows of fluff
-        clean = i_csv_list[i_csv_list.index(r):]
-        headers = [x.strip().upper().replace('HE ','') for x in clean[0]]
+        return self.filename[0:8]
+
+    def read_frame(self, i_fileobject, **kwargs):
+        """Overrides Superclass method. Reads past the rows of fluff 
+        in front of the actual header row, so the file object does 
+        not need to be seekable.
+        """
+        line = self.read_header(i_fileobject)
+        headers = [x.strip() for x in self.get_csv_row(line)]
+        return BaseCollectEvent.read_frame(self, i_fileobject, 
+            header=None, names=headers, **kwargs)
+    
+    def read_header(self, i_fileobject):
+        """Overrides Superclass method. The header row is the one 
+        starting with Node, after the rows of fluff.
+        """
+        line = i_fileobject.readline()
+        while line and self.get_csv_row(line)[:1] != ['Node']:
+            line = i_fileobject.readline()
+        return line
+
+    def load_frame(self, i_frame):
+        """This method accepts a DataFrame of the raw csv columns and 
+        it returns a Pandas DataFrame. 
+        """
+        return self._join_components(self._load_raw(i_frame))
+    
+    def load_chunk(self, i_frame):
+        """Overrides Superclass method. Chunks only go as far as the 
+        raw long format; the components are joined in merge_chunks.
+        """
+        return self._load_raw(i_frame)
+    
+    def merge_chunks(self, i_frames):
+        """Overrides Superclass method. Joins the components of the 
+        raw long format of every chunk.
+        """
+        return self._join_components(
+            pandas.concat(i_frames, ignore_index=True))
+    
+    def _load_raw(self, i_frame):
+        """This method reduces the raw csv columns to one price per 
+        node, hour and lmp_type.
+        """
+        headers = [x.strip().upper().replace('HE ','') for x in i_frame]
+        i_frame.columns = headers
+        hours = [str(x) for x in range(1,25)]
         
-        # find the datatype form the url 
-        datatype = MisoLmp._get_datatype_from_url(url=self.url)
+        # a row is rejected when any of its hours is not a number
+        prices = i_frame[hours].apply(pandas.to_numeric, errors='coerce')
+        valid = self.filter_rows([
+            ('hour is not a number',    prices.isnull().any(axis=1)),
+            ('missing node',            i_frame['NODE'].isnull()),
+            ('missing value',           i_frame['VALUE'].isnull()),
+        ])
+        prices = prices[valid].assign(
+            node=i_frame.loc[valid, 'NODE'].astype(str).str.upper(),
+            lmp_type=i_frame.loc[valid, 'VALUE'].astype(str).str.upper())
         
-        # loop through clean and build a list of dicts
-        # make EPT/UTC conversion on datetime columns
         # pivot table form wide to long format
-        output = []
-        # initialize a date for datetime columns
-        date = datetime.datetime.strptime(self.filename[0:8], '%Y%m%d')
-        for row in clean[1:]: 
-            try:
-                d = dict(zip(headers, 
-                        [x.upper().replace('\r','') for x in row]))
-                d['data'] = [{
-                    'datatype':     datatype,
-                    'iso':          'MISO',
-                    'node':         d['NODE'],
-                    'dt_utc':       localtz.localize(date 
-                                        + datetime.timedelta(hours=int(x)-1))
-                                        .astimezone(pytz.timezone('UTC')),
-                    'price':        float(d[str(x)]),
-                    'lmptype':      d['VALUE'],
-                } for x in range(1,25)]
-                output.extend(d['data'])
-            except Exception, er:
-                """
-                No logging implemented, but this is where we would 
-                handle errors from failed rows and log it.
-                """
-                self.rows_rejected += 1
-                pass
-        raw = pandas.DataFrame(output)
-        lmp = (raw[raw.lmptype == 'LMP']
-               .rename(columns={'price': 'lmp'})
-               .set_index(['dt_utc','node'])
-               .drop(['lmptype'], axis=1))
-        mcc = (raw[raw.lmptype == 'MCC']
-               .rename(columns={'price': 'cong'})
-               .set_index(['dt_utc','node'])
-               .drop(['datatype', 'iso', 'lmptype'], axis=1))
-        mlc = (raw[raw.lmptype == 'MLC']
-               .rename(columns={'price': 'loss'})
-               .set_index(['dt_utc','node'])
-               .drop(['datatype', 'iso', 'lmptype'], axis=1))
+        raw = pandas.melt(prices, id_vars=['node','lmp_type'], 
+            value_vars=hours, var_name='hour', value_name='price')
         
-        joined = lmp.join(mcc).join(mlc).reset_index(level=['dt_utc', 'node'])
-        joined['energy'] = joined['lmp'] - joined['cong'] - joined['loss']
-        
-        self.rows_accepted = len(joined)
-        cols_ordered = [
-            'datatype','iso','node','dt_utc'
-            ,'energy','cong','loss','lmp',
-        ]
-        self.data = joined[cols_ordered]
+        # all times are in EST, so a DST day still has 24 distinct
+        # hours; only those are converted and then broadcast
+        date = datetime.datetime.strptime(self.filename[0:8], '%Y%m%d')
+        local = pandas.Series(
+            [date + datetime.timedelta(hours=int(x)-1) for x in hours])
+        utc = tz.to_utc(local, MARKET_TZ)
+        raw['dt_utc'] = pandas.DatetimeIndex(utc).take(
+            raw['hour'].astype(int).values - 1)
+        return raw.drop(['hour'], axis=1)
+    
+    def _join_components(self, raw):
+        """This method reshapes the LMP, MCC and MLC rows of the raw 
+        long format into the Atlas LMP columns.
+        """
+        joined = pivot_components(raw, self.lmp_components, 
+            self.datatype, self.iso, i_filter_rows=self.filter_rows)
+        self.rows_accepted += len(joined)
+        self.data = joined
         return self.data
         
     @classmethod
@@ -106,7 +136,6 @@ class MisoLmp(BaseCollectEvent):
         """This class method builds  a url for the datatype 
         and date arguments.
         """
-        meta = MisoLmp.datatype_config()
         base = 'https://docs.misoenergy.org/marketreports/'
         try:
             startdate = kwargs.get('date').strftime('%Y%m%d')
@@ -115,34 +144,38 @@ class MisoLmp(BaseCollectEvent):
             pass
         url = base + '{0}{1}'.format(
             startdate,
-            [d['url_suffix'] for d in meta if 
-                d['atlas_datatype'] == kwargs.get('datatype')][0])
+            datatypes.get_config(cls.iso, 
+                kwargs.get('datatype'))['url_suffix'])
         return url
     
     @classmethod
     def _get_datatype_from_url(cls, **kwargs):
         """This class method finds the datatype for a given url."""
-        meta = MisoLmp.datatype_config()
         url = kwargs.get('url')
-        conf = [i for i in meta if i['url_suffix'] in url][0]
+        # the file name is the delivery date and the url suffix
+        conf = datatypes.find_config(cls.iso, url.split('/')[-1][8:])
         return conf['atlas_datatype']
     
     @classmethod
     def datatype_config(cls):
         """This class method maps the Atlas datatype to a URL suffix."""
-        config = [
-            {
-                'atlas_datatype':   'DALMP_EXPOST',
-                'url_suffix':       '_da_expost_lmp.csv'
-            },{
-                'atlas_datatype':   'DALMP_EXANTE',
-                'url_suffix':       '_da_exante_lmp.csv',
-            },{
-                'atlas_datatype':   'RTLMP_PRELIM',
-                'url_suffix':       '_rt_lmp_prelim.csv'
-            },{
-                'atlas_datatype':   'RTLMP',
-                'url_suffix':       '_rt_lmp_final.csv'
-            }
-        ]
-        return config
\ No newline at end of file
+        return datatypes.get_configs(cls.iso)
+
+
+# MISO datatype configs, looked up through atlas.energy.datatypes
+DATATYPE_CONFIG = [
+    {
+        'atlas_datatype':   'DALMP_EXPOST',
+        'url_suffix':       '_da_expost_lmp.csv'
+    },{
+        'atlas_datatype':   'DALMP_EXANTE',
+        'url_suffix':       '_da_exante_lmp.csv',
+    },{
+        'atlas_datatype':   'RTLMP_PRELIM',
+        'url_suffix':       '_rt_lmp_prelim.csv'
+    },{
+        'atlas_datatype':   'RTLMP',
+        'url_suffix':       '_rt_lmp_final.csv'
+    }
+]
+datatypes.register(MisoLmp.iso, DATATYPE_CONFIG, 'url_suffix')
@@ -14,17 +14,21 @@
 import sys
 import datetime
 
-import pandas
-import pytz
+from atlas import BaseCollectEvent, tz
+from atlas.energy.lmp import set_lmp_dtypes
+from atlas.lazy import LazyModule
 
-from atlas import BaseCollectEvent
+pandas = LazyModule('pandas')
 
 
 class BaseSppLmp(BaseCollectEvent):
     """This is the Super Class for all SPP LMP collector classes."""
     
+    iso = 'SPP'
+    node_col = 'Pnode'
+    
     def __init__(self, **kwargs):
-        BaseCollectEvent.__init__(self)
+        BaseCollectEvent.__init__(self, **kwargs)
         
 
 class SppDaLmp(BaseSppLmp):
@@ -32,50 +36,54 @@ class SppDaLmp(BaseSppLmp):
     collect the SPP LMP data in daily increments."""
     
     def __init__(self, **kwargs):
-        BaseSppLmp.__init__(self)
+        BaseSppLmp.__init__(self, **kwargs)
         self.url = kwargs.get('url')
         self.filename = self.url[-25:]
         self.datatype = 'DALMP'
     
-    def load_data(self, i_csv_list):
-        output = []
-        headers = i_csv_list[0]
-        localtz = pytz.timezone('America/Chicago')
+    def get_delivery_date(self):
+        """Overrides Superclass method. The file name carries the 
+        delivery date after the DA-LMP-B- prefix.
+        """
+        return self.filename[9:17]
+    
+    def load_frame(self, i_frame):
+        """This method accepts a DataFrame of the raw csv columns and 
+        it returns a Pandas DataFrame. 
+        """
+        i_frame.columns = [h.strip().lower() for h in i_frame]
         gmt_col = False
-        if 'GMT' in ','.join(headers).upper():
+        if 'GMT' in ','.join(i_frame.columns).upper():
             gmt_col = True
-        for row in i_csv_list[1:]:
-            _d = dict(zip(
-                [h.lower() for h in headers], [x.upper() for x in row]))
-            try:
-                if gmt_col:
-                    dt_utc = (datetime.datetime
-                        .strptime(_d['gmtintervalend'],'%m/%d/%Y %H:%M:%S')
-                        + datetime.timedelta(hours=-1))
-                else:
-                    dt_utc = (localtz.localize(datetime.datetime
-                        .strptime(_d['interval'],'%m/%d/%Y %H:%M:%S'))
-                        .astimezone(pytz.timezone('UTC'))
-                        + datetime.timedelta(hours=-1))
-                d = {
-                    'datatype':     self.datatype,
-                    'iso':          'SPP',
-                    'node':         _d['pnode'],
-                    'dt_utc':       dt_utc,
-                    'energy':       float(_d['mec']),
-                    'cong':         float(_d['mcc']),
-                    'loss':         float(_d['mlc']),
-                    'lmp':          float(_d['lmp']),
-                }
-                output.append(d)
-            except Exception, er:
-                print er
-                pass
-        cols_ordered = [
-            'datatype','iso','node','dt_utc'
-            ,'energy','cong','loss','lmp',
-        ]
-        self.data = pandas.DataFrame(output)[cols_ordered]
+        if gmt_col:
+            dt = pandas.to_datetime(i_frame['gmtintervalend'], 
+                format='%m/%d/%Y %H:%M:%S', errors='coerce')
+        else:
+            dt = pandas.to_datetime(i_frame['interval'], 
+                format='%m/%d/%Y %H:%M:%S', errors='coerce')
+        prices = i_frame[['mec','mcc','mlc','lmp']].apply(
+            pandas.to_numeric, errors='coerce')
+        valid = self.filter_rows([
+            ('price is not a number',   prices.isnull().any(axis=1)),
+            ('bad interval',            dt.isnull()),
+            ('missing pnode',           i_frame['pnode'].isnull()),
+        ])
+        dt = dt[valid]
+        if not gmt_col:
+            dt = tz.to_utc(dt, 'America/Chicago')
+        output = pandas.DataFrame({
+            'node':         i_frame.loc[valid, 'pnode']
+                                .astype(str).str.upper(),
+            'dt_utc':       dt + datetime.timedelta(hours=-1),
+            'energy':       prices.loc[valid, 'mec'],
+            'cong':         prices.loc[valid, 'mcc'],
+            'loss':         prices.loc[valid, 'mlc'],
+            'lmp':          prices.loc[valid, 'lmp'],
+        })
+        output['datatype'] = self.datatype
+        output['iso'] = self.iso
+        self.rows_accepted += len(output)
+        self.data = set_lmp_dtypes(output, self.iso)
         return self.data
     
     @classmethod
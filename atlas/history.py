@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""
+        atlas.history
+        ~~~~~~~~~~~~~~
+        This file provides a local history store for LMP output. Frames
+        are written as Parquet, one file per delivery date under
+        iso/datatype/month, with the rows sorted by node and dt_utc so
+        the min/max statistics of each row group cover a narrow run of
+        nodes. A range query opens only the files of the months and
+        dates it covers and reads only the row groups whose statistics
+        can match. Nodes are written as plain strings, since pyarrow
+        takes the statistics of a dictionary column from the whole
+        dictionary, and are read back as categoricals.
+
+        A date with rows is not necessarily whole, e.g. after a real
+        time poll, so a date is marked complete explicitly, by fill or
+        a write of whole days, with an empty marker file next to its
+        Parquet file. The dates of a range without one are the gaps a
+        backfill has to fetch. It needs pyarrow.
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+import bisect
+import datetime
+import os
+import tempfile
+
+import numpy
+import pandas
+
+from atlas.energy import lmp
+
+
+# rows per Parquet row group, the unit a query reads or skips
+ROW_GROUP_ROWS = 10000
+# market time zone of each ISO; a delivery date is a local date in it
+ISO_TZ = {
+    'CAISO':    'America/Los_Angeles',
+    'ERCOT':    'America/Chicago',
+    'MISO':     'Etc/GMT+5',
+    'SPP':      'America/Chicago',
+}
+# format of the delivery date files; the month partition is its head
+DATE_FORMAT = '%Y-%m-%d'
+# extension of the Parquet file of a delivery date
+DATA_EXT = '.parquet'
+# extension of the empty file marking a delivery date complete
+COMPLETE_EXT = '.complete'
+# columns read back as categoricals
+CATEGORY_COLUMNS = ['datatype', 'iso', 'node']
+
+
+class HistoryStore(object):
+    """This class stores LMP DataFrames under root, partitioned by
+    iso, datatype and delivery month, and answers node and time range
+    queries over them.
+    """
+
+    def __init__(self, root, row_group_rows=ROW_GROUP_ROWS):
+        import pyarrow
+        self.root = root
+        self.row_group_rows = row_group_rows
+
+    def write(self, frame, complete=None):
+        """This method stores a DataFrame of get_data LMP output. The
+        rows are split by delivery date and merged into the file of
+        each date, replacing stored rows with the same node and dt_utc.
+        complete lists the 'YYYY-MM-DD' delivery dates frame holds in
+        full; those of them written are marked complete. It returns
+        the delivery dates written.
+        """
+        complete = set(complete or [])
+        if not set(lmp.LMP_COLUMNS) <= set(frame.columns):
+            raise ValueError('history only stores the LMP columns')
+        frame = frame[lmp.LMP_COLUMNS].reset_index(drop=True)
+        frame['dt_utc'] = _to_utc(frame['dt_utc'])
+        written = []
+        groups = frame.groupby(['iso', 'datatype'], observed=True).indices
+        for (iso, datatype), rows in groups.items():
+            part = frame.take(rows)
+            days = get_delivery_dates(part['dt_utc'], iso)
+            for day, index in _get_positions(days).items():
+                self.write_date(iso, datatype, day, part.take(index))
+                if day in complete:
+                    self.mark_complete(iso, datatype, day)
+                written.append(day)
+        return sorted(written)
+
+    def write_date(self, iso, datatype, day, frame):
+        """This method merges frame into the file of delivery date day,
+        a 'YYYY-MM-DD' string, and rewrites it sorted.
+        """
+        import pyarrow
+        import pyarrow.parquet
+        path = self.get_path(iso, datatype, day)
+        if os.path.exists(path):
+            frame = lmp.concat_frames(
+                [self.read_table(path).to_pandas(), frame])
+            frame = frame.drop_duplicates(['node', 'dt_utc'], keep='last')
+        frame = _sort(frame)
+        frame['node'] = frame['node'].astype(str)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        os.close(fd)
+        pyarrow.parquet.write_table(
+            pyarrow.Table.from_pandas(frame, preserve_index=False), tmp,
+            row_group_size=self.row_group_rows)
+        os.rename(tmp, path)
+
+    def read(self, iso, datatype, nodes=None, start=None, end=None):
+        """This method returns a Pandas DataFrame of the stored rows of
+        iso and datatype for nodes, or all nodes, with dt_utc from
+        start up to but not including end. Naive datetimes are UTC.
+        The result is sorted by delivery date, node and dt_utc. The
+        row groups of every file are read first and converted to
+        pandas in one go, since the per-file conversion dominates.
+        """
+        iso = iso.upper()
+        if nodes is not None:
+            nodes = sorted(set(str(n).upper() for n in nodes))
+        start = _to_timestamp(start)
+        end = _to_timestamp(end)
+        # a delivery date's intervals lie within a day of its UTC date
+        first = start - pandas.Timedelta(days=1) if start is not None else None
+        last = end + pandas.Timedelta(days=1) if end is not None else None
+        tables = []
+        for day in self.get_dates(iso, datatype, first, last):
+            table = self.read_table(self.get_path(iso, datatype, day),
+                nodes, start, end)
+            if table is not None:
+                tables.append(table)
+        if not tables:
+            return pandas.DataFrame(columns=lmp.LMP_COLUMNS)
+        import pyarrow
+        data = pyarrow.concat_tables(tables).to_pandas()
+        keep = numpy.ones(len(data), dtype=bool)
+        if nodes is not None:
+            keep &= data['node'].isin(nodes).values
+        if start is not None:
+            keep &= (data['dt_utc'] >= start).values
+        if end is not None:
+            keep &= (data['dt_utc'] < end).values
+        if keep.all():
+            return data
+        return data[keep].reset_index(drop=True)
+
+    def read_table(self, path, nodes=None, start=None, end=None):
+        """This method returns a pyarrow Table of the row groups of the
+        file at path whose statistics can hold rows of nodes with
+        dt_utc from start up to but not including end, or None when
+        none can.
+        """
+        import pyarrow.parquet
+        source = pyarrow.parquet.ParquetFile(path,
+            read_dictionary=CATEGORY_COLUMNS, memory_map=True)
+        groups = get_row_groups(source.metadata, nodes, start, end)
+        if not groups:
+            return None
+        return source.read_row_groups(groups)
+
+    def mark_complete(self, iso, datatype, day):
+        """This method records that the stored rows of delivery date
+        day are the whole day, so get_missing_dates skips it.
+        """
+        open(self.get_path(iso, datatype, day, COMPLETE_EXT), 'w').close()
+
+    def get_dates(self, iso, datatype, start=None, end=None):
+        """This method returns the stored delivery dates of iso and
+        datatype, as 'YYYY-MM-DD' strings, from the date of start up to
+        but not including the date of end. Only the month partitions
+        of the range are listed.
+        """
+        return self._list_dates(iso, datatype, start, end, DATA_EXT)
+
+    def get_complete_dates(self, iso, datatype, start=None, end=None):
+        """This method returns the delivery dates of iso and datatype
+        marked complete, like get_dates.
+        """
+        return self._list_dates(iso, datatype, start, end, COMPLETE_EXT)
+
+    def _list_dates(self, iso, datatype, start, end, i_ext):
+        """This method returns the delivery dates from start up to end
+        with a file of extension i_ext.
+        """
+        folder = os.path.join(self.root, iso.upper(), datatype)
+        if not os.path.isdir(folder):
+            return []
+        first = _to_date(start)
+        last = _to_date(end)
+        dates = []
+        for month in sorted(os.listdir(folder)):
+            if first and month < first[:7] or last and month > last[:7]:
+                continue
+            for name in os.listdir(os.path.join(folder, month)):
+                day, ext = os.path.splitext(name)
+                if ext != i_ext:
+                    continue
+                if first and day < first or last and day >= last:
+                    continue
+                dates.append(day)
+        return sorted(dates)
+
+    def get_missing_dates(self, iso, datatype, startdate, enddate):
+        """This method returns the delivery dates from startdate up to
+        but not including enddate that are not marked complete, as
+        datetimes. They may hold some rows already.
+        """
+        stored = set(self.get_complete_dates(iso, datatype, startdate,
+            enddate))
+        missing = []
+        day = datetime.datetime(startdate.year, startdate.month,
+            startdate.day)
+        while day < enddate:
+            if day.strftime(DATE_FORMAT) not in stored:
+                missing.append(day)
+            day += datetime.timedelta(days=1)
+        return missing
+
+    def fill(self, iso, datatype, startdate, enddate, **kwargs):
+        """This method collects the missing delivery dates from
+        startdate up to but not including enddate with collect_range,
+        one call per run of consecutive dates, and stores them. The
+        dates of the run are marked complete; rows that fall on the
+        neighbouring dates are stored but do not complete them. The
+        keyword args go to collect_range; with nodes or pnode only
+        those nodes are collected, so no date is marked complete. It
+        returns the delivery dates written.
+        """
+        from atlas import batch
+        subset = (kwargs.get('nodes') is not None
+            or kwargs.get('pnode') is not None)
+        written = []
+        for first, last in _get_runs(
+                self.get_missing_dates(iso, datatype, startdate, enddate)):
+            data = batch.collect_range(iso, datatype, first,
+                last + datetime.timedelta(days=1), **kwargs)
+            days = [_to_date(first + datetime.timedelta(days=i))
+                for i in range((last - first).days + 1)]
+            if len(data):
+                written.extend(self.write(data,
+                    complete=None if subset else days))
+        return written
+
+    def get_path(self, iso, datatype, day, ext=DATA_EXT):
+        """This method returns where the rows of delivery date day are
+        stored, or with ext its other files.
+        """
+        return os.path.join(self.root, iso, datatype, day[:7], day + ext)
+
+
+def get_row_groups(i_metadata, i_nodes=None, i_start=None, i_end=None):
+    """This function returns the indices of the row groups in the
+    Parquet i_metadata whose statistics can hold rows of the sorted
+    i_nodes with dt_utc from i_start up to but not including i_end.
+    """
+    names = [i_metadata.schema.column(j).name
+        for j in range(i_metadata.num_columns)]
+    groups = []
+    for i in range(i_metadata.num_row_groups):
+        group = i_metadata.row_group(i)
+        node = _get_bounds(group, names.index('node'))
+        dt = _get_bounds(group, names.index('dt_utc'))
+        if i_nodes is not None and node is not None and not _overlaps(
+                i_nodes, node[0], node[1]):
+            continue
+        if dt is not None and (i_start is not None and dt[1] < i_start
+                or i_end is not None and dt[0] >= i_end):
+            continue
+        groups.append(i)
+    return groups
+
+
+def get_delivery_dates(i_dt_utc, i_iso):
+    """This function returns the delivery date of each UTC interval in
+    i_dt_utc as a 'YYYY-MM-DD' string array. Only the distinct days are
+    formatted.
+    """
+    local = pandas.DatetimeIndex(i_dt_utc).tz_convert(ISO_TZ[i_iso])
+    local = local.tz_localize(None).values.astype('datetime64[D]')
+    codes, uniques = pandas.factorize(local)
+    days = pandas.DatetimeIndex(uniques).strftime(DATE_FORMAT)
+    return numpy.array(days, dtype=str)[codes]
+
+
+def _get_positions(i_values):
+    """This function maps each distinct value of the array i_values to
+    the positions that hold it.
+    """
+    return pandas.Series(i_values).groupby(i_values).indices
+
+
+def _sort(i_frame):
+    """This function returns i_frame sorted by node name and dt_utc."""
+    codes, uniques = pandas.factorize(i_frame['node'])
+    names = numpy.asarray(uniques, dtype=object)
+    rank = numpy.empty(len(names), dtype='i8')
+    rank[numpy.argsort(names)] = numpy.arange(len(names))
+    order = numpy.lexsort((
+        pandas.DatetimeIndex(i_frame['dt_utc']).asi8, rank[codes]))
+    return i_frame.take(order).reset_index(drop=True)
+
+
+def _get_bounds(i_group, i_column):
+    """This function returns the min and max statistics of a column of
+    a row group, or None when the file has none.
+    """
+    stats = i_group.column(i_column).statistics
+    if stats is None or not stats.has_min_max:
+        return None
+    return stats.min, stats.max
+
+
+def _overlaps(i_nodes, i_min, i_max):
+    """This function returns whether any of the sorted i_nodes lies
+    between i_min and i_max.
+    """
+    i = bisect.bisect_left(i_nodes, i_min)
+    return i < len(i_nodes) and i_nodes[i] <= i_max
+
+
+def _get_runs(i_dates):
+    """This function returns the runs of consecutive days in the sorted
+    i_dates as (first, last) pairs.
+    """
+    runs = []
+    for day in i_dates:
+        if runs and day - runs[-1][1] == datetime.timedelta(days=1):
+            runs[-1] = (runs[-1][0], day)
+        else:
+            runs.append((day, day))
+    return runs
+
+
+def _to_utc(i_dt):
+    """This function returns a datetime Series as UTC, taking naive
+    values to be UTC already.
+    """
+    if getattr(i_dt.dtype, 'tz', None) is None:
+        return i_dt.dt.tz_localize('UTC')
+    return i_dt.dt.tz_convert('UTC')
+
+
+def _to_timestamp(i_dt):
+    """This function returns a date or datetime as a UTC Timestamp,
+    taking a naive one to be UTC, or None for None.
+    """
+    if i_dt is None:
+        return None
+    ts = pandas.Timestamp(i_dt)
+    if ts.tz is None:
+        return ts.tz_localize('UTC')
+    return ts.tz_convert('UTC')
+
+
+def _to_date(i_dt):
+    """This function returns the 'YYYY-MM-DD' date of a date, datetime
+    or Timestamp, or None for None.
+    """
+    if i_dt is None:
+        return None
+    return i_dt.strftime(DATE_FORMAT)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+        atlas.instrument
+        ~~~~~~~~~~~~~~
+        This file provides the instrumentation hooks of the collector
+        classes. Collectors report the wall time and byte count of each
+        stage they run, and the rows they accepted and rejected with
+        the reason for each reject, to the instrument set here. None is
+        set by default, and then nothing is measured at all.
+
+        The stages are named after the collector methods:
+
+            get_file        the download, or the raw cache hit
+            extract_file    opening the archive members to parse
+            read_frame      tokenizing the csv into columns
+            load_frame      the transform into the Atlas layout
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+import logging
+
+
+_instrument = None
+
+
+class Instrument(object):
+    """This is the Super Class for instruments. Every hook is a no-op,
+    so subclasses only override the ones they need.
+    """
+
+    def on_stage(self, collector, stage, seconds, nbytes=None):
+        """This method is called after collector ran stage. nbytes is
+        the size of what the stage returned, when it is a file.
+        """
+        pass
+
+    def on_rows(self, collector, accepted, rejected, reasons):
+        """This method is called after collector parsed a file. reasons
+        maps each reject reason to its row count.
+        """
+        pass
+
+
+class LogInstrument(Instrument):
+    """This class logs every hook call as one line, and passes the
+    fields along as a dict in the 'atlas' attribute of the record for
+    structured handlers.
+    """
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger('atlas')
+        self.level = level
+
+    def on_stage(self, collector, stage, seconds, nbytes=None):
+        record = _get_record(collector)
+        record.update(stage=stage, seconds=seconds, bytes=nbytes)
+        msg = '%s %s %s %.3fs'
+        args = [record['iso'], record['datatype'], stage, seconds]
+        if nbytes is not None:
+            msg += ' %d bytes'
+            args.append(nbytes)
+        self.logger.log(self.level, msg, *args, extra={'atlas': record})
+
+    def on_rows(self, collector, accepted, rejected, reasons):
+        record = _get_record(collector)
+        record.update(accepted=accepted, rejected=rejected,
+            reasons=dict(reasons))
+        self.logger.log(self.level, '%s %s %d rows accepted, %d rejected %s',
+            record['iso'], record['datatype'], accepted, rejected,
+            record['reasons'], extra={'atlas': record})
+
+
+def get_instrument():
+    """This function returns the instrument collectors report to, or
+    None when instrumentation is off.
+    """
+    return _instrument
+
+
+def set_instrument(instrument):
+    """This function sets the instrument collectors report to. None
+    turns instrumentation off, which is the default.
+    """
+    global _instrument
+    _instrument = instrument
+
+
+def _get_record(collector):
+    """This function returns the fields that identify collector."""
+    return {
+        'iso':          getattr(collector, 'iso', None),
+        'datatype':     getattr(collector, 'datatype', None),
+        'url':          getattr(collector, 'url', None),
+    }
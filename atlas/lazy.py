@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+        atlas.lazy
+        ~~~~~~~~~~~~~~
+        This file provides deferred imports for the heavy dependencies.
+        A module that does
+
+            pandas = LazyModule('pandas')
+
+        uses pandas as before, but pandas is only imported on the first
+        attribute access, so a process that only plans urls with
+        build_url never pays for pandas, numpy or requests.
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+import importlib
+import types
+
+
+class LazyModule(types.ModuleType):
+    """This class stands in for the module name until an attribute is
+    first read, then imports it and takes over its namespace, so later
+    reads are plain attribute lookups.
+    """
+
+    def __init__(self, name):
+        types.ModuleType.__init__(self, name)
+        self.__dict__['_module'] = None
+
+    def __getattr__(self, attr):
+        module = self.__dict__['_module']
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__.update(module.__dict__)
+            self.__dict__['_module'] = module
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return '<lazy module {0!r}>'.format(self.__name__)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+        atlas.parallel
+        ~~~~~~~~~~~~~~
+        This file provides the multi-process parse behind
+        get_data(processes=n). The extracted csv is split at line
+        boundaries into chunks that each start with the header row, and
+        a pool of worker processes runs the collector's row-local stage,
+        load_chunk, on them. The partial results come back in file order
+        and the collector's whole-frame stage, merge_chunks, joins them.
+
+        The workers are forked from the parsing process, so they start
+        with its collector state and its atlas.tz memo.
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+import collections
+
+import StringIO
+
+from atlas.lazy import LazyModule
+
+multiprocessing = LazyModule('multiprocessing')
+
+
+# bytes of csv text handed to a worker at a time
+CHUNK_BYTES = 16 * 1024 * 1024
+# chunks queued per worker before the reader waits for results
+CHUNKS_IN_FLIGHT = 2
+
+
+def parse(collector, processes, chunk_bytes=CHUNK_BYTES):
+    """This function parses the downloaded file of collector over a
+    pool of processes and returns the merged DataFrame. The row counts
+    of the workers are added to the collector's.
+    """
+    source = collector.open_csv()
+    header = collector.read_header(source)
+    pool = multiprocessing.Pool(processes)
+    pending = collections.deque()
+    parts = []
+    try:
+        for text in split_lines(source, chunk_bytes):
+            pending.append(pool.apply_async(_parse_chunk,
+                ((collector, header + text),)))
+            if len(pending) >= processes * CHUNKS_IN_FLIGHT:
+                parts.append(pending.popleft().get())
+        while pending:
+            parts.append(pending.popleft().get())
+    finally:
+        pool.terminate()
+        pool.join()
+    frames = []
+    for frame, packed, accepted, rejected, rejects in parts:
+        frames.append(_unpack(frame, packed))
+        collector.rows_accepted += accepted
+        collector.rows_rejected += rejected
+        for reason, count in rejects.items():
+            collector.rejects[reason] = (
+                collector.rejects.get(reason, 0) + count)
+    return collector.run_stage('load_frame', collector.merge_chunks, frames)
+
+
+def split_lines(source, chunk_bytes=CHUNK_BYTES):
+    """This function yields the rest of the file object source as
+    strings of whole lines, about chunk_bytes long each. It reads in
+    blocks and cuts at the last newline, so the cost does not grow
+    with the number of lines.
+    """
+    rest = ''
+    while True:
+        block = source.read(chunk_bytes)
+        if not block:
+            break
+        block = rest + block
+        cut = block.rfind('\n') + 1
+        rest = block[cut:]
+        if cut:
+            yield block[:cut]
+    if rest:
+        yield rest + '\n'
+
+
+def _parse_chunk(job):
+    """This function runs in a worker. It parses one chunk of csv text
+    with the collector's read_frame and load_chunk and returns the
+    result with the rows the worker accepted and rejected. The
+    collector comes with the counts of the parent, so they start over.
+    """
+    collector, text = job
+    collector.rows_accepted = 0
+    collector.rows_rejected = 0
+    collector.rejects = {}
+    frame = collector.read_frame(StringIO.StringIO(text))
+    frame = collector.select_nodes(frame)
+    payload, packed = _pack(collector.load_chunk(frame))
+    return (payload, packed, collector.rows_accepted,
+        collector.rows_rejected, collector.rejects)
+
+
+def _pack(i_frame):
+    """This function returns i_frame with its string columns made
+    categorical, which pickles many times faster, and the names of the
+    columns it changed.
+    """
+    packed = [c for c in i_frame if i_frame[c].dtype == object]
+    if packed:
+        i_frame = i_frame.assign(**dict(
+            (c, i_frame[c].astype('category')) for c in packed))
+    return i_frame, packed
+
+
+def _unpack(i_frame, i_packed):
+    """This function reverts _pack."""
+    if i_packed:
+        i_frame = i_frame.assign(**dict(
+            (c, i_frame[c].astype(object)) for c in i_packed))
+    return i_frame
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+        atlas.poll
+        ~~~~~~~~~~~~~~
+        This file provides a stateful collector for the real time files
+        that are republished through the day, such as ERCOT RTLMP, CAISO
+        RTLMP_RTPD and MISO RTLMP_PRELIM. Each poll goes to the server,
+        past any atlas.cache cache, and returns only the rows newer than
+        the last interval ingested for their node. A url polled before
+        is asked for with the ETag and Last-Modified of its previous
+        reply, so an unchanged file costs one 304 and no parse. CAISO
+        urls change with the query window, which is narrowed to the
+        intervals not yet ingested instead.
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+import datetime
+
+import pandas
+
+from atlas import NotModified
+from atlas.energy.lmp import LMP_COLUMNS
+
+
+# ISOs whose build_url takes a UTC startdatetime/enddatetime window
+WINDOW_ISOS = ('CAISO',)
+# hours after midnight UTC that the market day of each ISO starts
+MARKET_DAY_START = {'CAISO': 7, 'MISO': 5}
+
+
+class IncrementalCollector(object):
+    """This class polls one real time file with the collector class
+    i_class. With url set every poll fetches that url; otherwise the
+    url of the current market day is built with i_class.build_url from
+    datatype and the remaining keyword args, e.g. pnode. nodes limits
+    the polls to those nodes.
+    """
+
+    def __init__(self, i_class, url=None, datatype=None, nodes=None,
+            **kwargs):
+        self.collector_class = i_class
+        self.url = url
+        self.datatype = datatype
+        self.nodes = nodes
+        self.url_args = kwargs
+        # last dt_utc ingested by node
+        self.last = {}
+        # (ETag, Last-Modified) of the last reply by url
+        self.validators = {}
+        # last and validators of a poll not committed yet
+        self.pending = None
+        self.collector = None
+
+    def poll(self, url=None, commit=True):
+        """This method returns a Pandas DataFrame of the intervals
+        published since the last poll. It is empty when the file has
+        not changed. url overrides get_url for this poll, e.g. for
+        ERCOT, whose files get a new url every interval. The raw and
+        frame caches are bypassed, since a cached copy of a file that
+        is still being published would hide the new intervals.
+
+        With commit off the poll is only recorded by a later commit(),
+        e.g. once the rows are stored; until then the next poll
+        returns the same rows again.
+        """
+        self.pending = None
+        url = url or self.get_url()
+        self.collector = self.collector_class(url=url, nodes=self.nodes)
+        self.collector.use_cache = False
+        self.collector.request_headers = self.get_request_headers(url)
+        try:
+            data = self.collector.get_data()
+        except NotModified:
+            return pandas.DataFrame(columns=LMP_COLUMNS)
+        headers = self.collector.response_headers
+        validators = {}
+        if headers.get('ETag') or headers.get('Last-Modified'):
+            validators[url] = (headers.get('ETag'),
+                headers.get('Last-Modified'))
+        new, latest = self.get_new(data)
+        self.pending = (latest, validators)
+        if commit:
+            self.commit()
+        return new
+
+    def commit(self):
+        """This method records the last intervals and validators of the
+        last poll, so the next poll starts after them.
+        """
+        if self.pending is not None:
+            latest, validators = self.pending
+            self.last.update(latest)
+            self.validators.update(validators)
+            self.pending = None
+
+    def get_url(self):
+        """This method returns the url to poll. For the ISOs in
+        WINDOW_ISOS the query starts at the hour of the earliest last
+        interval ingested, as long as that is in the current market day.
+        """
+        if self.url is not None:
+            return self.url
+        iso = self.collector_class.iso
+        offset = datetime.timedelta(hours=MARKET_DAY_START.get(iso, 0))
+        now = datetime.datetime.utcnow() - offset
+        day = datetime.datetime(now.year, now.month, now.day)
+        kwargs = dict(self.url_args, datatype=self.datatype)
+        if iso not in WINDOW_ISOS:
+            kwargs['date'] = day
+            return self.collector_class.build_url(**kwargs)
+        start = day + offset
+        if self.last:
+            earliest = min(self.last.values()).floor('H').to_pydatetime()
+            start = max(start, earliest.replace(tzinfo=None))
+        kwargs.update(startdatetime=start,
+            enddatetime=day + offset + datetime.timedelta(days=1))
+        return self.collector_class.build_url(**kwargs)
+
+    def get_request_headers(self, i_url):
+        """This method returns the conditional request headers for
+        i_url, or None before its first reply. Validators are kept by
+        url, as ETags are, so a CAISO window url, which changes once
+        new intervals are ingested, is only ever conditional when the
+        window has not moved.
+        """
+        etag, modified = self.validators.get(i_url, (None, None))
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if modified:
+            headers['If-Modified-Since'] = modified
+        return headers or None
+
+    def filter_new(self, i_frame):
+        """This method returns the rows of i_frame later than the last
+        interval ingested for their node, and records the new last
+        intervals.
+        """
+        new, latest = self.get_new(i_frame)
+        self.last.update(latest)
+        return new
+
+    def get_new(self, i_frame):
+        """This method returns the rows of i_frame later than the last
+        interval ingested for their node, and a dict of the new last
+        interval by node, without recording it.
+        """
+        node = i_frame['node'].astype(object)
+        new = i_frame
+        if self.last:
+            last = node.map(self.last)
+            new = i_frame[last.isnull() | (i_frame['dt_utc'] > last)]
+        latest = new.groupby(node[new.index])['dt_utc'].max()
+        return new.reset_index(drop=True), latest.to_dict()
@@ -0,0 +1,450 @@
+# -*- coding: utf-8 -*-
+"""
+        atlas.scheduler
+        ~~~~~~~~~~~~~~
+        This file provides a long-running collection scheduler. Each job
+        follows the publication cadence of one ISO datatype and runs its
+        collector class when the next file is due, rather than at fixed
+        cron times. Due jobs come off a priority queue ordered by due
+        time and run on a pool of worker threads.
+
+        Requests are spaced by a token bucket per ISO host, so OASIS
+        gets no more than its rate limit however many CAISO jobs are
+        due, and a circuit breaker per host stops requests to a host
+        that keeps failing until a cool-down has passed. A file that is
+        not out yet, a 404 or a real time file with no new intervals,
+        is checked again after a growing back-off until the next file
+        is due.
+
+        Usage, from the directory holding atlas/:
+
+            python -m atlas.scheduler --history /data/atlas/history
+                [ISO:DATATYPE ...]
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+import argparse
+import datetime
+import heapq
+import itertools
+import logging
+import sys
+import threading
+import time
+import urlparse
+
+from atlas.lazy import LazyModule
+
+requests = LazyModule('requests')
+
+
+# when each datatype is published: the seconds between files, the
+# seconds after a UTC period boundary a file is expected, the seconds
+# between the first checks for a late file, the delivery day of a file
+# relative to the UTC day it is published, and whether it is a real
+# time file polled for new intervals
+PUBLICATIONS = {
+    ('CAISO', 'RTLMP_RTPD'):    {'period': 900, 'delay': 300,
+                                    'retry': 30, 'poll': True},
+    ('ERCOT', 'RTLMP'):         {'period': 900, 'delay': 300,
+                                    'retry': 30, 'poll': True},
+    ('MISO', 'DALMP_EXPOST'):   {'period': 86400, 'delay': 19 * 3600,
+                                    'retry': 300, 'days_ahead': 1},
+    ('SPP', 'DALMP'):           {'period': 86400, 'delay': 20 * 3600,
+                                    'retry': 300, 'days_ahead': 1},
+}
+# requests per second and burst allowed against a host; OASIS allows
+# one request per caiso.OASIS_REQUEST_INTERVAL seconds
+HOST_RATES = {
+    'oasis.caiso.com':      (0.2, 1),
+}
+# rate and burst of any other host
+DEFAULT_RATE = (1.0, 4)
+# consecutive failures that open the circuit breaker of a host
+BREAKER_FAILURES = 5
+# seconds an open breaker waits before letting a trial request through
+BREAKER_COOLDOWN = 300
+# longest wait between checks for a late file
+RETRY_MAX = 900
+# longest sleep of the dispatch loop, so stop() is seen promptly
+IDLE_SLEEP = 1.0
+# worker threads running collectors
+WORKERS = 4
+
+
+class Job(object):
+    """This class follows the publications of one iso and datatype,
+    with the cadence of PUBLICATIONS overridden by any of its keys in
+    kwargs. Other kwargs go to build_url, e.g. pnode. get_url, a
+    function of the job, supplies the url of the current file for
+    collectors without a build_url, such as ERCOT's.
+    """
+
+    def __init__(self, iso, datatype, get_url=None, nodes=None, **kwargs):
+        config = {'retry': 60, 'days_ahead': 0, 'poll': False}
+        config.update(PUBLICATIONS.get((iso, datatype), {}))
+        for key in ['period', 'delay', 'retry', 'days_ahead', 'poll']:
+            if key in kwargs:
+                config[key] = kwargs.pop(key)
+        if 'period' not in config:
+            raise ValueError('no publication cadence for {0} {1}'.format(
+                iso, datatype))
+        self.iso = iso
+        self.datatype = datatype
+        self.collector_class = _get_collector(iso, datatype)
+        if get_url is None and not hasattr(self.collector_class,
+                'build_url'):
+            raise ValueError(
+                '{0} has no build_url, pass get_url instead'.format(iso))
+        self.period = config['period']
+        self.delay = config['delay']
+        self.retry = config['retry']
+        self.days_ahead = config['days_ahead']
+        self.url_function = get_url
+        self.nodes = nodes
+        self.url_args = kwargs
+        self.poller = None
+        if config['poll']:
+            from atlas import poll
+            url_args = kwargs if get_url is None else {}
+            self.poller = poll.IncrementalCollector(self.collector_class,
+                datatype=datatype, nodes=nodes, **url_args)
+        # publication time of the file being collected
+        self.due = self.get_publication(time.time())
+        self.attempts = 0
+
+    def __repr__(self):
+        return '<Job {0} {1}>'.format(self.iso, self.datatype)
+
+    def get_publication(self, now):
+        """This method returns the time the latest file due by now was
+        expected.
+        """
+        return (now - self.delay) // self.period * self.period + self.delay
+
+    def get_url(self):
+        """This method returns the url of the file being collected."""
+        if self.url_function is not None:
+            return self.url_function(self)
+        if self.poller is not None:
+            return self.poller.get_url()
+        return self.collector_class.build_url(datatype=self.datatype,
+            date=self._get_day(), **self.url_args)
+
+    def get_delivery_date(self):
+        """This method returns the 'YYYY-MM-DD' delivery date of the
+        file being collected when it is a whole day of every node built
+        with build_url, else None.
+        """
+        if (self.url_function is not None or self.poller is not None
+                or self.nodes is not None):
+            return None
+        return self._get_day().strftime('%Y-%m-%d')
+
+    def collect(self, url):
+        """This method returns a Pandas DataFrame of the new rows at
+        url: the intervals not seen before for a polled file, which
+        commit() records as seen, else the whole file.
+        """
+        if self.poller is not None:
+            return self.poller.poll(url, commit=False)
+        return self.collector_class(url=url, nodes=self.nodes).get_data()
+
+    def commit(self):
+        """This method records a polled file as ingested, once its new
+        rows are stored, so a failed store polls them again.
+        """
+        if self.poller is not None:
+            self.poller.commit()
+
+    def reschedule(self, now, collected):
+        """This method returns when the job runs next. After collecting
+        the file that is the next publication; otherwise a retry after
+        a wait that doubles with each attempt, unless the next file
+        would be due by then.
+        """
+        if collected:
+            self.attempts = 0
+            self.due = self.get_publication(now) + self.period
+            return self.due
+        self.attempts += 1
+        retry = now + min(self.retry * 2 ** (self.attempts - 1), RETRY_MAX)
+        if retry < self.due + self.period:
+            return retry
+        self.attempts = 0
+        self.due = max(self.due + self.period, self.get_publication(now))
+        return self.due
+
+    def _get_day(self):
+        """This method returns the delivery day of the file published
+        at self.due.
+        """
+        day = datetime.datetime.utcfromtimestamp(self.due)
+        day = datetime.datetime(day.year, day.month, day.day)
+        return day + datetime.timedelta(days=self.days_ahead)
+
+
+class TokenBucket(object):
+    """This class allows rate requests per second on average and up to
+    burst at once.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = None
+
+    def get_wait(self, now):
+        """This method returns the seconds until a request is allowed,
+        0 when one is allowed now.
+        """
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        """This method spends the token of a request."""
+        self._refill(now)
+        self.tokens -= 1
+
+    def _refill(self, now):
+        if self.updated is not None:
+            self.tokens = min(self.burst,
+                self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class CircuitBreaker(object):
+    """This class stops requests to a host after failures consecutive
+    failures. Once cooldown seconds have passed one trial request goes
+    through; its success closes the breaker and its failure opens it
+    again.
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES,
+            cooldown=BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.count = 0
+        self.opened = None
+        self.trial = False
+
+    def allow(self, now):
+        """This method returns the seconds until a request is allowed,
+        0 when one is allowed now.
+        """
+        if self.opened is None:
+            return 0
+        if self.trial:
+            return self.cooldown
+        wait = self.opened + self.cooldown - now
+        if wait > 0:
+            return wait
+        self.trial = True
+        return 0
+
+    def record(self, success, now):
+        """This method records the outcome of a request."""
+        self.trial = False
+        if success:
+            self.count = 0
+            self.opened = None
+            return
+        self.count += 1
+        if self.count >= self.failures or self.opened is not None:
+            self.opened = now
+
+
+class Scheduler(object):
+    """This class runs jobs as their files are due and passes the new
+    rows of each to handler(job, frame), on the worker thread that
+    collected them.
+    """
+
+    def __init__(self, handler, workers=WORKERS):
+        self.handler = handler
+        self.workers = workers
+        self.logger = logging.getLogger('atlas')
+        # (due time, insertion order, job)
+        self.queue = []
+        self.counter = itertools.count()
+        self.buckets = {}
+        self.breakers = {}
+        self.stopped = False
+        self.condition = threading.Condition()
+
+    def add(self, job, due=None):
+        """This method queues job to run at due, or at its own due
+        time.
+        """
+        with self.condition:
+            heapq.heappush(self.queue, (job.due if due is None else due,
+                next(self.counter), job))
+            self.condition.notify()
+
+    def run(self, until=None):
+        """This method runs the queued jobs until stop is called or the
+        time until, and then waits for the running ones.
+        """
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(self.workers)
+        try:
+            with self.condition:
+                while not self.stopped and (until is None
+                        or time.time() < until):
+                    wait = self.dispatch(pool, time.time())
+                    self.condition.wait(min(wait, IDLE_SLEEP))
+        finally:
+            pool.close()
+            pool.join()
+
+    def stop(self):
+        """This method makes run return."""
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def dispatch(self, pool, now):
+        """This method starts the jobs due by now whose hosts allow a
+        request, requeues the others for when they do, and returns the
+        seconds until the next job is due. It is called holding the
+        condition.
+        """
+        while self.queue and self.queue[0][0] <= now:
+            due, order, job = heapq.heappop(self.queue)
+            try:
+                url = job.get_url()
+            except Exception, er:
+                self.logger.warning('%r: no url: %s', job, er)
+                self.add(job, job.reschedule(now, False))
+                continue
+            host = urlparse.urlparse(url).netloc
+            bucket = self.get_bucket(host)
+            wait = bucket.get_wait(now) or self.get_breaker(host).allow(now)
+            if wait:
+                self.add(job, now + wait)
+                continue
+            bucket.take(now)
+            pool.apply_async(self._run, (job, url, host))
+        if not self.queue:
+            return IDLE_SLEEP
+        return max(self.queue[0][0] - now, 0)
+
+    def get_bucket(self, host):
+        """This method returns the token bucket of host."""
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(
+                *HOST_RATES.get(host, DEFAULT_RATE))
+        return self.buckets[host]
+
+    def get_breaker(self, host):
+        """This method returns the circuit breaker of host."""
+        if host not in self.breakers:
+            self.breakers[host] = CircuitBreaker()
+        return self.breakers[host]
+
+    def _run(self, job, url, host):
+        """This method collects url for job on a worker thread, hands
+        new rows to the handler and requeues the job.
+        """
+        collected = False
+        host_failed = False
+        try:
+            frame = job.collect(url)
+            if len(frame):
+                self.handler(job, frame)
+                collected = True
+            job.commit()
+        except Exception, er:
+            host_failed = _is_host_failure(er)
+            if not _is_not_published(er):
+                self.logger.warning('%r: %s failed: %s', job, url, er)
+        with self.condition:
+            now = time.time()
+            self.get_breaker(host).record(not host_failed, now)
+            self.add(job, job.reschedule(now, collected))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Collect ISO files as they are published.')
+    parser.add_argument('publications', nargs='*',
+        help='ISO:DATATYPE to collect, by default those with a '
+            'build_url: {0}'.format(', '.join(
+                '{0}:{1}'.format(*k) for k in sorted(PUBLICATIONS))))
+    parser.add_argument('--history', required=True,
+        help='atlas.history store the new rows are written to')
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    args = parser.parse_args(argv)
+
+    from atlas import history
+    logging.basicConfig(level=logging.INFO,
+        format='%(asctime)s %(levelname)s %(message)s')
+    store = history.HistoryStore(args.history)
+    scheduler = Scheduler(lambda job, frame: store.write(frame,
+        complete=filter(None, [job.get_delivery_date()])), args.workers)
+    if args.publications:
+        keys = [tuple(p.upper().split(':', 1)) for p in args.publications]
+    else:
+        keys = [k for k in sorted(PUBLICATIONS)
+            if hasattr(_get_collector(*k), 'build_url')]
+    for iso, datatype in keys:
+        scheduler.add(Job(iso, datatype))
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        scheduler.stop()
+    return 0
+
+
+def _get_collector(iso, datatype):
+    """This function returns the collector class of a datatype."""
+    from atlas.energy import caiso, ercot, miso, spp
+    classes = {
+        ('ERCOT', 'DALMP'):     ercot.ErcotDaLmp,
+        ('ERCOT', 'RTLMP'):     ercot.ErcotRtLmp,
+    }
+    classes.update((k, caiso.CaisoLmp) for k in _keys('CAISO'))
+    classes.update((k, miso.MisoLmp) for k in _keys('MISO'))
+    classes[('SPP', 'DALMP')] = spp.SppDaLmp
+    try:
+        return classes[(iso, datatype)]
+    except KeyError:
+        raise ValueError('no collector for {0} {1}'.format(iso, datatype))
+
+
+def _keys(i_iso):
+    """This function returns the (iso, datatype) keys of the registered
+    datatypes of i_iso.
+    """
+    from atlas.energy import datatypes
+    return [(i_iso, c['atlas_datatype'])
+        for c in datatypes.get_configs(i_iso)]
+
+
+def _is_host_failure(i_error):
+    """This function returns whether i_error counts against the host:
+    connection errors, timeouts, 429 and 5xx replies.
+    """
+    if not isinstance(i_error, requests.RequestException):
+        return False
+    response = getattr(i_error, 'response', None)
+    if response is None:
+        return True
+    return response.status_code == 429 or response.status_code >= 500
+
+
+def _is_not_published(i_error):
+    """This function returns whether i_error means the file is not out
+    yet.
+    """
+    response = getattr(i_error, 'response', None)
+    return response is not None and response.status_code == 404
+
+
+if __name__ == '__main__':
+    sys.exit(main())
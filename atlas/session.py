@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+        atlas.session
+        ~~~~~~~~~~~~~~
+        This file provides the HTTP session and connection pool shared
+        by all collectors. Every download goes through get(), so
+        repeated requests to an ISO host reuse keep-alive connections
+        instead of paying a new TCP and TLS handshake each time.
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+import threading
+
+from atlas.lazy import LazyModule
+
+requests = LazyModule('requests')
+
+
+# number of hosts to keep a connection pool for
+POOL_CONNECTIONS = 10
+# keep-alive connections kept per host
+POOL_MAXSIZE = 16
+# retries on connection errors and 5xx responses
+RETRIES = 3
+# retry waits grow as backoff_factor * 2 ** (retry - 1) seconds
+BACKOFF_FACTOR = 0.5
+# (connect, read) timeout in seconds
+TIMEOUT = (10, 300)
+
+_config = {
+    'pool_connections':     POOL_CONNECTIONS,
+    'pool_maxsize':         POOL_MAXSIZE,
+    'retries':              RETRIES,
+    'backoff_factor':       BACKOFF_FACTOR,
+    'timeout':              TIMEOUT,
+}
+_session = None
+_lock = threading.Lock()
+
+
+def configure(**kwargs):
+    """This function updates the pool settings. It accepts the keys of
+    _config and drops the current session, so the next request builds
+    one with the new settings.
+    """
+    global _session
+    for k in kwargs:
+        if k not in _config:
+            raise TypeError('unknown session setting {0}'.format(k))
+    with _lock:
+        _config.update(kwargs)
+        _session = None
+
+
+def get_session():
+    """This function returns the shared requests Session, building it
+    on first use.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            _session = build_session()
+        return _session
+
+
+def set_session(session):
+    """This function replaces the shared session, e.g. with one that
+    points at a local stand-in server in tests. None restores the
+    default on the next request.
+    """
+    global _session
+    with _lock:
+        _session = session
+
+
+def build_session():
+    """This function builds a requests Session with pooled, retrying
+    adapters for http and https.
+    """
+    from requests.adapters import HTTPAdapter
+    from requests.packages.urllib3.util.retry import Retry
+    retry = Retry(
+        total=_config['retries'],
+        backoff_factor=_config['backoff_factor'],
+        status_forcelist=(500, 502, 503, 504))
+    adapter = HTTPAdapter(
+        pool_connections=_config['pool_connections'],
+        pool_maxsize=_config['pool_maxsize'],
+        max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get(url, **kwargs):
+    """This function issues a GET on the shared session with the
+    configured timeout.
+    """
+    kwargs.setdefault('timeout', _config['timeout'])
+    return get_session().get(url, **kwargs)
+
+
+def get_timeout():
+    """This function returns the configured read timeout, for the
+    urllib2 ftp path that cannot use the session.
+    """
+    return _config['timeout'][1]
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+        atlas.sink
+        ~~~~~~~~~~~~~~
+        This file provides bulk-load sinks for collector output. A sink
+        takes the DataFrames of get_data, the LMP layout or the ERCOT
+        constraint layout, and loads them into a SQL store in large
+        batches. Rows are staged in an unindexed table first and merged
+        into the target in one statement per batch, replacing any row
+        with the same key. The unique index on the key is created after
+        the first load rather than maintained during it.
+
+        SqliteSink writes to a local SQLite file. PostgresSink loads
+        over COPY through any DB-API connection that has copy_expert,
+        e.g. one from psycopg2.
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+import sqlite3
+
+import numpy
+import pandas
+import StringIO
+
+from atlas.energy.ercot import BaseErcot
+from atlas.energy.lmp import LMP_COLUMNS
+
+
+# rows staged before they are merged into the target table
+BATCH_ROWS = 1000000
+# format of dt_utc in the store; always UTC, without an offset
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+# columns stored as floats; everything else but dt_utc is text
+FLOAT_COLUMNS = ['energy', 'cong', 'loss', 'lmp']
+# table name, columns and upsert key of each output layout
+TABLES = {
+    'lmp':          (LMP_COLUMNS, ['iso', 'datatype', 'node', 'dt_utc']),
+    'constraints':  (BaseErcot.get_const_cols(), ['iso', 'datatype',
+                        'dt_utc', 'constraint_id', 'contingency_name',
+                        'from_station', 'to_station']),
+}
+
+
+class BulkSink(object):
+    """This is the Super Class for sinks. Subclasses supply the SQL
+    dialect: the column types, how a frame is staged and how the stage
+    is merged into the target.
+    """
+
+    # SQL types of a float, a timestamp and a text column
+    float_type = 'REAL'
+    datetime_type = 'TEXT'
+    text_type = 'TEXT'
+
+    def __init__(self, connection, batch_rows=BATCH_ROWS):
+        self.connection = connection
+        self.batch_rows = batch_rows
+        # rows staged by table
+        self.staged = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if exc_info[0] is None:
+            self.flush()
+        self.close()
+
+    def write(self, i_frame):
+        """This method stages a DataFrame of get_data output, and
+        merges the stage of its table once it holds batch_rows rows.
+        """
+        if not len(i_frame):
+            return
+        table = get_table(i_frame)
+        if table not in self.staged:
+            self.create(table)
+            self.staged[table] = 0
+        columns = TABLES[table][0]
+        self.stage(table, prepare(i_frame, columns))
+        self.staged[table] += len(i_frame)
+        if self.staged[table] >= self.batch_rows:
+            self.flush(table)
+
+    def flush(self, table=None):
+        """This method merges the staged rows of table, or of every
+        table, into the target and commits.
+        """
+        for name in ([table] if table else list(self.staged)):
+            if not self.staged.get(name):
+                continue
+            self.merge(name)
+            self.staged[name] = 0
+        self.connection.commit()
+
+    def close(self):
+        """This method closes the connection. Rows that were not
+        flushed are lost.
+        """
+        self.connection.close()
+
+    def create(self, table):
+        """This method creates table, if missing, and its stage."""
+        columns = TABLES[table][0]
+        cursor = self.connection.cursor()
+        cursor.execute('CREATE TABLE IF NOT EXISTS {0} ({1})'.format(
+            table, self.get_column_defs(columns)))
+        cursor.execute(self.get_stage_ddl(table, columns))
+
+    def get_column_defs(self, columns):
+        """This method returns the column definitions of a table."""
+        defs = []
+        for c in columns:
+            if c in FLOAT_COLUMNS:
+                defs.append('{0} {1}'.format(c, self.float_type))
+            elif c == 'dt_utc':
+                defs.append('{0} {1}'.format(c, self.datetime_type))
+            else:
+                defs.append('{0} {1}'.format(c, self.text_type))
+        return ', '.join(defs)
+
+    def has_key_index(self, table):
+        """This method returns whether the unique key index of table
+        exists yet.
+        """
+        raise NotImplementedError
+
+    def get_stage_ddl(self, table, columns):
+        """This method returns the statement that creates the stage of
+        table.
+        """
+        raise NotImplementedError
+
+    def stage(self, table, frame):
+        """This method appends the prepared frame to the stage of
+        table.
+        """
+        raise NotImplementedError
+
+    def merge(self, table):
+        """This method moves the stage of table into table, the last
+        staged row winning for each key, and empties the stage. The
+        first merge into a table loads it and then builds the key index.
+        """
+        raise NotImplementedError
+
+
+class SqliteSink(BulkSink):
+    """This class bulk-loads into a SQLite database file."""
+
+    def __init__(self, path, batch_rows=BATCH_ROWS):
+        connection = sqlite3.connect(path)
+        # one fsync per batch commit is enough for a rebuildable store
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        BulkSink.__init__(self, connection, batch_rows)
+
+    def has_key_index(self, table):
+        cursor = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='index' AND name=?",
+            (table + '_key',))
+        return cursor.fetchone() is not None
+
+    def get_stage_ddl(self, table, columns):
+        return 'CREATE TEMP TABLE IF NOT EXISTS {0}_stage ({1})'.format(
+            table, self.get_column_defs(columns))
+
+    def stage(self, table, frame):
+        columns = TABLES[table][0]
+        self.connection.executemany(
+            'INSERT INTO {0}_stage VALUES ({1})'.format(
+                table, ', '.join('?' * len(columns))),
+            _get_rows(frame))
+
+    def merge(self, table):
+        columns, key = TABLES[table]
+        cols = ', '.join(columns)
+        if self.has_key_index(table):
+            self.connection.execute(
+                'INSERT OR REPLACE INTO {0} ({1}) SELECT {1} '
+                'FROM {0}_stage ORDER BY rowid'.format(table, cols))
+        else:
+            self.connection.execute(
+                'INSERT INTO {0} ({1}) SELECT {1} FROM {0}_stage '
+                'WHERE rowid IN (SELECT MAX(rowid) FROM {0}_stage '
+                'GROUP BY {2})'.format(table, cols, ', '.join(key)))
+            self.connection.execute(
+                'CREATE UNIQUE INDEX {0}_key ON {0} ({1})'.format(
+                    table, ', '.join(key)))
+        self.connection.execute('DELETE FROM {0}_stage'.format(table))
+
+
+class PostgresSink(BulkSink):
+    """This class bulk-loads into Postgres with COPY. It accepts an
+    open DB-API connection whose cursors have copy_expert, such as a
+    psycopg2 connection, so psycopg2 is only needed by callers.
+    """
+
+    float_type = 'DOUBLE PRECISION'
+    datetime_type = 'TIMESTAMP'
+
+    def has_key_index(self, table):
+        cursor = self.connection.cursor()
+        cursor.execute(
+            'SELECT 1 FROM pg_indexes WHERE indexname = %s',
+            (table + '_key',))
+        return cursor.fetchone() is not None
+
+    def get_stage_ddl(self, table, columns):
+        return ('CREATE TEMP TABLE IF NOT EXISTS {0}_stage ({1}, '
+            'seq BIGSERIAL)'.format(table, self.get_column_defs(columns)))
+
+    def stage(self, table, frame):
+        columns = TABLES[table][0]
+        buf = StringIO.StringIO()
+        frame.to_csv(buf, header=False, index=False, columns=columns,
+            encoding='utf-8')
+        buf.seek(0)
+        self.connection.cursor().copy_expert(self.get_copy_sql(table), buf)
+
+    def get_copy_sql(self, table):
+        """This method returns the COPY statement that stages table.
+        CSV COPY reads an unquoted empty field, which is how to_csv
+        writes '', as NULL, and NULLs never conflict in the key index.
+        The text key columns are read with FORCE_NOT_NULL so a blank,
+        e.g. an ERCOT contingency_name, stays '' and upserts.
+        """
+        columns, key = TABLES[table]
+        text_key = [c for c in key
+            if c not in FLOAT_COLUMNS and c != 'dt_utc']
+        return ('COPY {0}_stage ({1}) FROM STDIN WITH (FORMAT csv, '
+            'FORCE_NOT_NULL ({2}))'.format(table, ', '.join(columns),
+                ', '.join(text_key)))
+
+    def merge(self, table):
+        columns, key = TABLES[table]
+        cols = ', '.join(columns)
+        keys = ', '.join(key)
+        select = ('SELECT DISTINCT ON ({2}) {1} FROM {0}_stage '
+            'ORDER BY {2}, seq DESC'.format(table, cols, keys))
+        cursor = self.connection.cursor()
+        if self.has_key_index(table):
+            cursor.execute(
+                'INSERT INTO {0} ({1}) {2} ON CONFLICT ({3}) '
+                'DO UPDATE SET {4}'.format(table, cols, select, keys,
+                    ', '.join('{0} = EXCLUDED.{0}'.format(c)
+                        for c in columns if c not in key)))
+        else:
+            cursor.execute('INSERT INTO {0} ({1}) {2}'.format(
+                table, cols, select))
+            cursor.execute('CREATE UNIQUE INDEX {0}_key ON {0} ({1})'
+                .format(table, keys))
+        cursor.execute('TRUNCATE {0}_stage'.format(table))
+
+
+def get_table(i_frame):
+    """This function returns the table of the layout of i_frame."""
+    for table, (columns, key) in TABLES.items():
+        if set(key) <= set(i_frame.columns):
+            return table
+    raise ValueError('no sink table for columns {0}'.format(
+        list(i_frame.columns)))
+
+
+def prepare(i_frame, i_columns):
+    """This function returns the i_columns of i_frame ready to load:
+    categoricals as plain values and dt_utc as naive UTC text. Only the
+    distinct timestamps are formatted.
+    """
+    frame = i_frame[i_columns].copy()
+    codes, uniques = pandas.factorize(frame['dt_utc'])
+    uniques = pandas.DatetimeIndex(uniques)
+    if uniques.tz is not None:
+        uniques = uniques.tz_convert('UTC').tz_localize(None)
+    text = numpy.append(uniques.strftime(DATETIME_FORMAT), [None])
+    frame['dt_utc'] = text[codes]
+    for c in i_columns:
+        if str(frame[c].dtype) == 'category':
+            frame[c] = frame[c].astype(object)
+    return frame
+
+
+def _get_rows(i_frame):
+    """This function returns the rows of a prepared frame as tuples,
+    with missing values as None.
+    """
+    columns = []
+    for c in i_frame:
+        values = i_frame[c].values.astype(object)
+        values[pandas.isnull(values)] = None
+        columns.append(values)
+    return zip(*columns)
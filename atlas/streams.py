@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+        atlas.streams
+        ~~~~~~~~~~~~~~
+        This file provides file objects that feed archive members to
+        the csv parser as they are decompressed, instead of reading
+        them into strings first.
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+
+class MemberReader(object):
+    """This class reads the named members of a ZipFile one after the
+    other as a single file. Each member after the first starts with
+    the same header row as the first, and that line is skipped as the
+    member is opened. A member that does not end in a newline gets one,
+    so its last row never runs into the next member.
+    """
+
+    def __init__(self, zipfile, names, skip_header=True):
+        self.zipfile = zipfile
+        self.names = list(names)
+        self.skip_header = skip_header
+        self._index = 0
+        self._member = None
+        self._last = '\n'
+
+    def read(self, size=-1):
+        """This method returns up to size bytes, or everything left
+        when size is negative.
+        """
+        chunks = []
+        while size != 0:
+            member = self._get_member()
+            if member is None:
+                break
+            data = member.read(size) if size > 0 else member.read()
+            if not data:
+                data = self._end_member()
+                if not data:
+                    continue
+            chunks.append(data)
+            self._last = data[-1]
+            if size > 0:
+                size -= len(data)
+        return ''.join(chunks)
+
+    def readline(self, size=-1):
+        """This method returns the next line, newline included."""
+        while True:
+            member = self._get_member()
+            if member is None:
+                return ''
+            line = member.readline(size)
+            if line:
+                # only the last line of a member can end without one
+                if size < 0 and line[-1] != '\n':
+                    line += '\n'
+                self._last = line[-1]
+                return line
+            line = self._end_member()
+            if line:
+                return line
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def close(self):
+        """This method closes the open member. The ZipFile stays open."""
+        if self._member is not None:
+            self._member.close()
+            self._member = None
+        self._index = len(self.names)
+
+    def _get_member(self):
+        """This method returns the member being read, opening the next
+        one when there is none, or None once every member is read.
+        """
+        if self._member is None and self._index < len(self.names):
+            self._member = self.zipfile.open(self.names[self._index])
+            if self._index > 0 and self.skip_header:
+                self._member.readline()
+            self._index += 1
+        return self._member
+
+    def _end_member(self):
+        """This method closes the exhausted member and returns the 
+        newline it was missing, if any.
+        """
+        self._member.close()
+        self._member = None
+        if self._last != '\n':
+            return '\n'
+        return ''
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+        atlas.tz
+        ~~~~~~~~~~~~~~
+        This file provides the conversion of ISO local-time columns
+        to UTC shared by all collectors.
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+import threading
+
+from atlas.lazy import LazyModule
+
+numpy = LazyModule('numpy')
+pandas = LazyModule('pandas')
+pytz = LazyModule('pytz')
+
+
+# conversions memoized per (tz, ambiguous, nonexistent) before a reset
+MEMO_MAX_SIZE = 100000
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+def to_utc(i_local, i_tz, ambiguous=False, nonexistent='shift'):
+    """This function converts a Series of naive local datetimes to a
+    Series of UTC datetimes with the same index. Only the distinct
+    values are localized, in one tz_localize call, and the results are
+    memoized so a delivery day seen before costs a dict lookup. The
+    memo is shared by every thread and only used under a lock. The
+    Series must not contain NaT.
+
+    ambiguous handles the repeated fall-back hour: False reads it as
+    standard time, True as daylight time, 'NaT' drops it and 'raise'
+    raises. nonexistent handles the skipped spring-forward hour:
+    'shift' reads it as standard time like pytz localize does, 'NaT'
+    drops it and 'raise' raises.
+    """
+    codes, uniques = pandas.factorize(i_local)
+    keys = pandas.DatetimeIndex(uniques).asi8
+    with _memo_lock:
+        memo = _memo.setdefault((i_tz, ambiguous, nonexistent), {})
+        missing = [k for k in keys if k not in memo]
+        if missing:
+            if len(memo) + len(missing) > MEMO_MAX_SIZE:
+                memo.clear()
+            utc = _localize(pandas.DatetimeIndex(missing), i_tz,
+                ambiguous, nonexistent)
+            memo.update(zip(missing, utc))
+        values = [memo[k] for k in keys]
+    utc = pandas.DatetimeIndex(
+        numpy.array(values, dtype='i8'), tz='UTC')
+    return pandas.Series(utc.take(codes), index=i_local.index)
+
+
+def _localize(i_index, i_tz, ambiguous, nonexistent):
+    """This function localizes a DatetimeIndex of distinct local times
+    and returns their UTC values as int64 nanoseconds.
+    """
+    if ambiguous in (True, False):
+        flags = numpy.array([ambiguous] * len(i_index))
+    else:
+        flags = ambiguous
+    errors = 'raise' if nonexistent == 'raise' else 'coerce'
+    local = i_index.tz_localize(i_tz, ambiguous=flags, errors=errors)
+    utc = local.tz_convert('UTC').asi8.copy()
+    if nonexistent == 'shift':
+        localtz = pytz.timezone(i_tz)
+        for i in numpy.flatnonzero(local.isnull()):
+            dt = i_index[i].to_pydatetime()
+            try:
+                localtz.localize(dt, is_dst=None)
+            except pytz.NonExistentTimeError:
+                utc[i] = pandas.Timestamp(
+                    localtz.localize(dt, is_dst=False)).value
+            except pytz.AmbiguousTimeError:
+                pass
+    return utc
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+"""
+        benchmarks
+        ~~~~~~~~~~~~~~
+        This package replays ISO sample files through the collector
+        classes to measure their performance. See benchmarks.run.
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
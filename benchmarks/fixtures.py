@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+"""
+        benchmarks.fixtures
+        ~~~~~~~~~~~~~~
+        This file writes sample files in the layout each ISO publishes,
+        sized like a full delivery day. The values are random but
+        seeded, so every run replays the same bytes. A recorded file
+        dropped into the fixture directory under the same name is used
+        as is instead.
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+import datetime
+import os
+import random
+import tempfile
+import zipfile
+
+
+# the delivery day every fixture covers
+DATE = datetime.datetime(2018, 6, 10)
+# the spring-forward day of the DST fixtures
+DST_DATE = datetime.datetime(2018, 3, 11)
+# rows of a full delivery day; scale multiplies the node counts
+FULL_DAY = {
+    'miso_nodes':               2300,
+    'caiso_nodes':              4000,
+    'spp_nodes':                1100,
+    'ercot_points':             900,
+    'ercot_resources':          700,
+    'ercot_sced_runs':          288,
+    'ercot_da_constraints':     40,
+    'ercot_rt_constraints':     20,
+}
+# seed of the random values
+SEED = 2018
+
+# offset of GMT from CDT for the SPP GMT columns
+_CDT = datetime.timedelta(hours=5)
+
+
+def get_count(key, scale):
+    """This function returns the full day count for key times scale,
+    and at least one.
+    """
+    return max(1, int(round(FULL_DAY[key] * scale)))
+
+
+def write_all(path, scale=1.0):
+    """This function writes every fixture missing from path and
+    returns path.
+    """
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    for name, writer in FIXTURES:
+        target = os.path.join(path, name)
+        if not os.path.exists(target):
+            writer(target, scale, random.Random(SEED))
+    return path
+
+
+def _prices(rng, low, high, digits=2):
+    """This function returns a pool of formatted prices to draw from,
+    which is far cheaper than formatting a float per cell.
+    """
+    return ['{0:.{1}f}'.format(rng.uniform(low, high), digits)
+        for i in range(997)]
+
+
+def _write_zip(target, members):
+    """This function writes a zip archive of (name, writer) members,
+    where each writer fills an open file. Members are staged on disk
+    so a large day never sits in memory.
+    """
+    archive = zipfile.ZipFile(target + '.part', 'w', zipfile.ZIP_DEFLATED)
+    for name, writer in members:
+        fd, tmp = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            writer(f)
+        archive.write(tmp, name)
+        os.remove(tmp)
+    archive.close()
+    os.rename(target + '.part', target)
+
+
+def _write_miso(target, scale, rng, date):
+    """This function writes a MISO real-time final LMP csv for date."""
+    pool = _prices(rng, -5, 60)
+    with open(target + '.part', 'wb') as f:
+        f.write('"Real-Time Ex-Post LMPs (Final)"\r\n')
+        f.write(date.strftime('%m/%d/%Y') + '\r\n,,,,\r\n')
+        f.write('"All Hours-Ending are Eastern Standard Time (EST)"\r\n')
+        f.write('Node,Type,Value,'
+            + ','.join('HE {0}'.format(h) for h in range(1, 25)) + '\r\n')
+        for i in range(get_count('miso_nodes', scale)):
+            for value in ('LMP', 'MCC', 'MLC'):
+                f.write('NODE{0},Gennode,{1},{2}\r\n'.format(i, value,
+                    ','.join(rng.choice(pool) for h in range(24))))
+    os.rename(target + '.part', target)
+
+
+def write_miso(target, scale, rng):
+    """This function writes a MISO real-time final LMP csv."""
+    _write_miso(target, scale, rng, DATE)
+
+
+def write_miso_dst(target, scale, rng):
+    """This function writes a MISO real-time final LMP csv for the
+    spring-forward day, whose hours ending are still 1 to 24 EST.
+    """
+    _write_miso(target, scale, rng, DST_DATE)
+
+
+def _caiso_writer(rng, scale, market, price_col, step, lmp_types):
+    """This function returns a member writer of CAISO OASIS rows for
+    each node, interval and lmp_type in lmp_types.
+    """
+    pool = _prices(rng, -5, 60, 5)
+    start = DATE + datetime.timedelta(hours=7)
+    times = []
+    for k in range(24 * 60 // step):
+        t = start + datetime.timedelta(minutes=step * k)
+        times.append((t.strftime('%Y-%m-%dT%H:%M:%S-00:00'),
+            (t + datetime.timedelta(minutes=step))
+                .strftime('%Y-%m-%dT%H:%M:%S-00:00'),
+            k * step // 60 + 1, k % (60 // step) + 1))
+    header = ('INTERVALSTARTTIME_GMT,INTERVALENDTIME_GMT,OPR_DT,OPR_HR,'
+        'OPR_INTERVAL,NODE_ID_XML,NODE_ID,NODE,MARKET_RUN_ID,LMP_TYPE,'
+        'XML_DATA_ITEM,PNODE_RESMRID,GRP_TYPE,POS,{0},GROUP\n'
+        .format(price_col))
+    row = '{0},{1},{2},{3},{4},{5},{5},{5},{6},{7},LMP_{7}_PRC,{5},ALL,1,'
+    opr_dt = DATE.strftime('%Y-%m-%d')
+
+    def writer(f):
+        f.write(header)
+        for lmp_type in lmp_types:
+            for i in range(get_count('caiso_nodes', scale)):
+                node = 'NODE_{0}_7_N001'.format(i)
+                for gmt_start, gmt_end, hour, interval in times:
+                    f.write(row.format(gmt_start, gmt_end, opr_dt, hour,
+                        interval, node, market, lmp_type))
+                    f.write(rng.choice(pool) + ',1\n')
+    return writer
+
+
+def write_caiso_dam(target, scale, rng):
+    """This function writes a CAISO DAM archive, one member per
+    lmp_type.
+    """
+    prefix = '20180610_20180611_PRC_LMP_DAM_'
+    _write_zip(target, [(prefix + '{0}_v1.csv'.format(t),
+        _caiso_writer(rng, scale, 'DAM', 'MW', 60, [t]))
+        for t in ('LMP', 'MCC', 'MCL', 'MCE')])
+
+
+def write_caiso_rtpd(target, scale, rng):
+    """This function writes a CAISO RTPD archive with every lmp_type
+    in a single member.
+    """
+    _write_zip(target, [('20180610_20180611_PRC_RTPD_LMP_RTPD_ALL_v1.csv',
+        _caiso_writer(rng, scale, 'RTPD', 'PRC', 15,
+            ['LMP', 'MCC', 'MCL', 'MCE', 'MGHG']))])
+
+
+def write_caiso_hasp(target, scale, rng):
+    """This function writes a CAISO HASP archive with every lmp_type
+    in a single member.
+    """
+    _write_zip(target, [('20180610_20180611_PRC_HASP_LMP_HASP_ALL_v1.csv',
+        _caiso_writer(rng, scale, 'HASP', 'MW', 15,
+            ['LMP', 'MCC', 'MCL', 'MCE', 'MGHG']))])
+
+
+def _write_spp(target, scale, rng, gmt):
+    """This function writes an SPP DA LMP by bus csv, with the
+    GMTIntervalEnd column when gmt is set.
+    """
+    pool = _prices(rng, -5, 60, 4)
+    with open(target + '.part', 'wb') as f:
+        f.write('Interval,' + ('GMTIntervalEnd,' if gmt else '')
+            + 'Settlement Location,Pnode,LMP,MLC,MCC,MEC\n')
+        for i in range(get_count('spp_nodes', scale)):
+            for h in range(1, 25):
+                local = DATE + datetime.timedelta(hours=h)
+                cols = [local.strftime('%m/%d/%Y %H:%M:%S')]
+                if gmt:
+                    cols.append((local + _CDT).strftime('%m/%d/%Y %H:%M:%S'))
+                cols += ['LOC{0}'.format(i), 'PNODE{0}'.format(i)]
+                cols += [rng.choice(pool) for c in range(4)]
+                f.write(','.join(cols) + '\n')
+    os.rename(target + '.part', target)
+
+
+def write_spp(target, scale, rng):
+    """This function writes an SPP DA LMP csv in local time."""
+    _write_spp(target, scale, rng, False)
+
+
+def write_spp_gmt(target, scale, rng):
+    """This function writes an SPP DA LMP csv with GMT columns."""
+    _write_spp(target, scale, rng, True)
+
+
+def write_ercot_da(target, scale, rng):
+    """This function writes an ERCOT DAM settlement point price
+    archive.
+    """
+    pool = _prices(rng, 10, 60)
+
+    def writer(f):
+        f.write('DeliveryDate,DeliveryHour,SettlementPoint,'
+            'SettlementPointPrice,DSTFlag\r\n')
+        for i in range(get_count('ercot_points', scale)):
+            for h in range(1, 25):
+                f.write('{0},{1:02d}:00,HB_{2},{3},N\r\n'.format(
+                    DATE.strftime('%m/%d/%Y'), h, i, rng.choice(pool)))
+    _write_zip(target, [('cdr.00012331.0000000000000000.20180610.123012.'
+        'DAMSPNP4190.csv', writer)])
+
+
+def write_ercot_rt(target, scale, rng):
+    """This function writes an ERCOT real-time settlement point price
+    archive.
+    """
+    pool = _prices(rng, 10, 60)
+
+    def writer(f):
+        f.write('DeliveryDate,DeliveryHour,DeliveryInterval,'
+            'SettlementPointName,SettlementPointType,'
+            'SettlementPointPrice,DSTFlag\r\n')
+        for i in range(get_count('ercot_points', scale)):
+            for h in range(1, 25):
+                for k in range(1, 5):
+                    f.write('{0},{1},{2},HB_{3},HU,{4},N\r\n'.format(
+                        DATE.strftime('%m/%d/%Y'), h, k, i,
+                        rng.choice(pool)))
+    _write_zip(target, [('cdr.00012301.0000000000000000.20180611.001501.'
+        'SPPHLZNP6905.csv', writer)])
+
+
+# scalar columns of the 60 day SCED generation resource disclosure
+SCED_SCALAR_COLS = [
+    'SCED Time Stamp', 'Repeated Hour Flag', 'Resource Name',
+    'Resource Type', 'QSE', 'DME', 'Output Schedule', 'HSL', 'HASL',
+    'HDL', 'LSL', 'LASL', 'LDL', 'Telemetered Resource Status',
+    'Base Point', 'Telemetered Net Output', 'Ancillary Service REGUP',
+    'Ancillary Service REGDN', 'Ancillary Service RRS',
+    'Ancillary Service NSRS', 'Bid_Type', 'Start Up Cold Offer',
+    'Start Up Hot Offer', 'Start Up Inter Offer', 'Min Gen Cost',
+    'Proxy Extension',
+]
+
+
+def write_ercot_sced(target, scale, rng):
+    """This function writes an ERCOT 60 day SCED disclosure archive
+    with the generation resource member and a load resource member.
+    """
+    pool = _prices(rng, 0, 300, 1)
+    header = list(SCED_SCALAR_COLS)
+    for sced in (1, 2):
+        for i in range(1, 36):
+            header += ['SCED{0} Curve-MW{1}'.format(sced, i),
+                'SCED{0} Curve-Price{1}'.format(sced, i)]
+    for i in range(1, 11):
+        header += ['Submitted TPO-MW{0}'.format(i),
+            'Submitted TPO-Price{0}'.format(i)]
+    numeric = len(header) - len(SCED_SCALAR_COLS)
+    runs = get_count('ercot_sced_runs', scale)
+
+    def writer(f):
+        f.write(','.join('"{0}"'.format(h) for h in header) + '\r\n')
+        for k in range(runs):
+            stamp = (DATE + datetime.timedelta(seconds=86400 * k // runs))
+            stamp = stamp.strftime('%m/%d/%Y %H:%M:%S')
+            for i in range(get_count('ercot_resources', scale)):
+                cols = [stamp, 'N', 'UNIT_{0}'.format(i), 'CCGT90',
+                    'QSE{0}'.format(i % 50), 'DME{0}'.format(i % 50)]
+                cols += [rng.choice(pool) for c in range(7)]
+                cols += ['ON']
+                cols += [rng.choice(pool) for c in range(6)]
+                cols += ['STATIC']
+                cols += [rng.choice(pool) for c in range(4)]
+                cols += ['N']
+                cols += [rng.choice(pool) for c in range(numeric)]
+                f.write(','.join('"{0}"'.format(c) for c in cols) + '\r\n')
+
+    def load_writer(f):
+        f.write('"SCED Time Stamp","Resource Name","Base Point"\r\n')
+
+    _write_zip(target, [
+        ('60d_Load_Resource_Data_in_SCED-10-JUN-18.csv', load_writer),
+        ('60d_SCED_Gen_Resource_Data-10-JUN-18.csv', writer)])
+
+
+def _constraint_cols(rng, i):
+    """This function returns the constraint, contingency and station
+    fields of constraint i.
+    """
+    return ['{0}'.format(i), 'BRANCH_{0}'.format(i),
+        'DCONTG{0}'.format(i % 7), 'STA{0}'.format(i),
+        'STB{0}'.format(i), '345', '138']
+
+
+def write_ercot_da_constraint(target, scale, rng):
+    """This function writes an ERCOT DAM shadow price archive."""
+    pool = _prices(rng, 0, 500)
+
+    def writer(f):
+        f.write('DeliveryDate,HourEnding,DeliveryTime,ConstraintID,'
+            'ConstraintName,ContingencyName,FromStation,ToStation,'
+            'FromStationkV,ToStationkV,ConstraintLimit,ConstraintValue,'
+            'ViolationAmount,ShadowPrice,DSTFlag\r\n')
+        for h in range(1, 25):
+            stamp = DATE + datetime.timedelta(hours=h - 1)
+            for i in range(get_count('ercot_da_constraints', scale)):
+                f.write(','.join([DATE.strftime('%m/%d/%Y'),
+                    '{0:02d}:00'.format(h),
+                    stamp.strftime('%m/%d/%Y %H:%M:%S')]
+                    + _constraint_cols(rng, i)
+                    + [rng.choice(pool) for c in range(4)] + ['N'])
+                    + '\r\n')
+    _write_zip(target, [('cdr.00012329.0000000000000000.20180609.123012.'
+        'DAMSPNP4190.csv', writer)])
+
+
+def write_ercot_rt_constraint(target, scale, rng):
+    """This function writes an ERCOT SCED shadow price archive."""
+    pool = _prices(rng, 0, 500)
+    runs = get_count('ercot_sced_runs', scale)
+
+    def writer(f):
+        f.write('SCEDTimeStamp,RepeatedHourFlag,ConstraintID,'
+            'ConstraintName,ContingencyName,FromStation,ToStation,'
+            'FromStationkV,ToStationkV,ShadowPrice,MaxShadowPrice,Limit,'
+            'Value,ViolatedMW\r\n')
+        for k in range(runs):
+            stamp = (DATE + datetime.timedelta(seconds=86400 * k // runs))
+            for i in range(get_count('ercot_rt_constraints', scale)):
+                f.write(','.join(
+                    [stamp.strftime('%m/%d/%Y %H:%M:%S'), 'N']
+                    + _constraint_cols(rng, i)
+                    + [rng.choice(pool) for c in range(5)]) + '\r\n')
+    _write_zip(target, [('cdr.00012302.0000000000000000.20180610.001512.'
+        'SCEDBTCNP686.csv', writer)])
+
+
+# fixture file names and the functions that write them
+FIXTURES = [
+    ('20180610_rt_lmp_final.csv',       write_miso),
+    ('20180311_rt_lmp_final.csv',       write_miso_dst),
+    ('caiso_dam.zip',                   write_caiso_dam),
+    ('caiso_rtpd.zip',                  write_caiso_rtpd),
+    ('caiso_hasp.zip',                  write_caiso_hasp),
+    ('DA-LMP-B-201806100100.csv',       write_spp),
+    ('DA-LMP-B-201806110100.csv',       write_spp_gmt),
+    ('ercot_da.zip',                    write_ercot_da),
+    ('ercot_rt.zip',                    write_ercot_rt),
+    ('ercot_sced.zip',                  write_ercot_sced),
+    ('ercot_da_constraint.zip',         write_ercot_da_constraint),
+    ('ercot_rt_constraint.zip',         write_ercot_rt_constraint),
+]
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+        benchmarks.history
+        ~~~~~~~~~~~~~~
+        This file checks that atlas.history range queries skip the row
+        groups that cannot hold the nodes asked for. It stores a
+        delivery day of every node in a temporary HistoryStore with
+        small row groups, queries a few nodes and hours of it, and
+        reports the row groups and rows read against the file.
+
+        Usage, from the directory holding atlas/:
+
+            python -m benchmarks.history [--nodes 2300] [--query 2]
+
+        The exit status is 1 when the query reads more than one row
+        group per node asked for.
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+import argparse
+import datetime
+import shutil
+import sys
+import tempfile
+
+import numpy
+import pandas
+
+from atlas import history
+from atlas.energy import lmp
+
+
+# nodes of the stored day, as in a full MISO day
+NODES = 2300
+# rows per row group, small so a day spans many groups
+ROW_GROUP_ROWS = 240
+# the stored delivery day
+DATE = datetime.datetime(2018, 6, 10)
+
+
+def build_day(nodes=NODES):
+    """This function returns a MISO LMP DataFrame of one delivery day
+    of hourly intervals for nodes nodes, in get_data layout.
+    """
+    names = ['NODE{0}'.format(i) for i in range(nodes)]
+    start = pandas.Timestamp(DATE + datetime.timedelta(hours=5), tz='UTC')
+    times = pandas.date_range(start, periods=24, freq='H')
+    frame = pandas.DataFrame({
+        'node':     numpy.repeat(names, len(times)),
+        'dt_utc':   numpy.tile(times, nodes),
+    })
+    prices = numpy.random.RandomState(2018).uniform(-5, 60, len(frame))
+    frame['energy'] = frame['lmp'] = prices
+    frame['cong'] = frame['loss'] = 0.0
+    frame['datatype'] = 'RTLMP'
+    frame['iso'] = 'MISO'
+    return lmp.set_lmp_dtypes(frame, 'MISO')
+
+
+def run(nodes=NODES, query=2):
+    """This function stores the day, queries query nodes over ten
+    hours and returns the row groups and rows of the file and those
+    read.
+    """
+    import pyarrow.parquet
+    root = tempfile.mkdtemp()
+    try:
+        store = history.HistoryStore(root, row_group_rows=ROW_GROUP_ROWS)
+        day = store.write(build_day(nodes))[0]
+        path = store.get_path('MISO', 'RTLMP', day)
+        start = pandas.Timestamp(DATE + datetime.timedelta(hours=8),
+            tz='UTC')
+        end = start + pandas.Timedelta(hours=10)
+        names = sorted('NODE{0}'.format(i) for i in range(query))
+        metadata = pyarrow.parquet.ParquetFile(path).metadata
+        table = store.read_table(path, names, start, end)
+        return {
+            'groups':       metadata.num_row_groups,
+            'rows':         metadata.num_rows,
+            'groups_read':  len(history.get_row_groups(
+                                metadata, names, start, end)),
+            'rows_read':    table.num_rows if table is not None else 0,
+        }
+    finally:
+        shutil.rmtree(root)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Check the row group pruning of history queries.')
+    parser.add_argument('--nodes', type=int, default=NODES,
+        help='nodes of the stored day')
+    parser.add_argument('--query', type=int, default=2,
+        help='nodes asked for')
+    args = parser.parse_args(argv)
+
+    result = run(args.nodes, args.query)
+    print 'row groups read {0} of {1}, rows read {2} of {3}'.format(
+        result['groups_read'], result['groups'], result['rows_read'],
+        result['rows'])
+    if result['groups_read'] > args.query:
+        print 'NOT PRUNED {0} row groups read for {1} nodes'.format(
+            result['groups_read'], args.query)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+        benchmarks.run
+        ~~~~~~~~~~~~~~
+        This file replays the benchmarks.fixtures files through the full
+        get_data path of every collector class. The files are served
+        by a local HTTP stand-in, so the shared session, the download
+        spool and the unzip all run as they would against the ISO. Each
+        case runs in its own process and reports rows/sec, peak RSS and
+        the time spent in each stage:
+
+            fetch   open_raw, the download into the spool
+            unzip   extract_file; members are decompressed as split
+                    reads them, so that time shows under split
+            split   read_frame, tokenizing the csv into columns
+            load    load_frame, the transform into the Atlas layout
+
+        Usage, from the directory holding atlas/:
+
+            python -m benchmarks.run [--scale 0.1] [--repeat 3]
+                [--save out.json] [--baseline out.json] [case ...]
+
+        With --baseline the exit status is 1 when a case got slower or
+        bigger than the baseline by more than --tolerance.
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import SimpleHTTPServer
+import SocketServer
+import sys
+import tempfile
+import threading
+import time
+import urlparse
+
+from atlas.energy import caiso, ercot, miso, spp
+from benchmarks import fixtures
+
+
+# stage names and the collector methods timed for them
+STAGES = [
+    ('fetch',   'open_raw'),
+    ('unzip',   'extract_file'),
+    ('split',   'read_frame'),
+    ('load',    'load_frame'),
+]
+# case name, collector class, fixture file and the production url whose
+# query string the collector parses
+CASES = [
+    ('miso_rt', miso.MisoLmp, '20180610_rt_lmp_final.csv', None),
+    ('miso_rt_dst', miso.MisoLmp, '20180311_rt_lmp_final.csv', None),
+    ('caiso_dam', caiso.CaisoLmp, 'caiso_dam.zip',
+        caiso.CaisoLmp.build_url(datatype='DALMP_PRC', date=fixtures.DATE)),
+    ('caiso_rtpd', caiso.CaisoLmp, 'caiso_rtpd.zip',
+        caiso.CaisoLmp.build_url(datatype='RTLMP_RTPD', date=fixtures.DATE)),
+    ('caiso_hasp', caiso.CaisoLmp, 'caiso_hasp.zip',
+        caiso.CaisoLmp.build_url(datatype='HALMP_PRC', date=fixtures.DATE)),
+    ('spp_da', spp.SppDaLmp, 'DA-LMP-B-201806100100.csv',
+        spp.SppDaLmp.build_url(date=fixtures.DATE)),
+    ('spp_da_gmt', spp.SppDaLmp, 'DA-LMP-B-201806110100.csv', None),
+    ('ercot_da', ercot.ErcotDaLmp, 'ercot_da.zip', None),
+    ('ercot_rt', ercot.ErcotRtLmp, 'ercot_rt.zip', None),
+    ('ercot_sced', ercot.ErcotSced, 'ercot_sced.zip', None),
+    ('ercot_da_constraint', ercot.ErcotDaConstraint,
+        'ercot_da_constraint.zip', None),
+    ('ercot_rt_constraint', ercot.ErcotRtConstraint,
+        'ercot_rt_constraint.zip', None),
+]
+# allowed slow down and memory growth against a baseline
+TOLERANCE = 0.25
+
+
+class StandInHandler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+    """This class serves the fixture directory of its server. The 
+    query string is ignored and only the last path segment names the 
+    file.
+    """
+
+    def translate_path(self, path):
+        path = urlparse.urlparse(path).path
+        return os.path.join(self.server.root, path.split('/')[-1])
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    """This class is the local HTTP stand-in for the ISO hosts."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, root):
+        SocketServer.TCPServer.__init__(self, ('127.0.0.1', 0), 
+            StandInHandler)
+        self.root = root
+
+    def start(self):
+        """This method serves on a daemon thread and returns the base
+        url of the server.
+        """
+        t = threading.Thread(target=self.serve_forever)
+        t.daemon = True
+        t.start()
+        return 'http://127.0.0.1:{0}/'.format(self.server_address[1])
+
+
+def get_url(base, fixture, url=None):
+    """This function returns the stand-in url of fixture, carrying over
+    the query string of the production url.
+    """
+    query = urlparse.urlparse(url).query if url else ''
+    return base + fixture + ('?' + query if query else '')
+
+
+def run_case(cls, url, repeat):
+    """This function runs get_data on a new cls collector for url
+    repeat times and returns the timings of the fastest run along with
+    the rows returned and the peak RSS in MB.
+    """
+    rss_start = _get_max_rss()
+    best = None
+    for i in range(repeat):
+        collector = cls(url=url)
+        timings = dict((stage, 0.0) for stage, method in STAGES)
+        for stage, method in STAGES:
+            setattr(collector, method,
+                _timed(getattr(collector, method), stage, timings))
+        start = time.time()
+        data = collector.get_data()
+        timings['total'] = time.time() - start
+        timings['rows'] = len(data)
+        del collector, data
+        if best is None or timings['total'] < best['total']:
+            best = timings
+    best['rss_start_mb'] = rss_start
+    best['peak_rss_mb'] = _get_max_rss()
+    return best
+
+
+def run_all(path, names=None, repeat=1):
+    """This function serves path on a stand-in and runs each case in
+    names, or all of them, in a process of its own. It returns a dict
+    of results by case name.
+    """
+    # the stand-in has no rate limit to respect
+    caiso.OASIS_REQUEST_INTERVAL = 0
+    server = StandInServer(path)
+    base = server.start()
+    results = {}
+    try:
+        for name, cls, fixture, url in CASES:
+            if names and name not in names:
+                continue
+            result = _run_in_process(
+                cls, get_url(base, fixture, url), repeat)
+            result['mb'] = os.path.getsize(
+                os.path.join(path, fixture)) / 1024.0 ** 2
+            results[name] = result
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """This function returns a list of messages for the cases in
+    results that are slower or use more memory than in baseline by more
+    than tolerance.
+    """
+    messages = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        new, old = results[name], baseline[name]
+        if _get_rate(new) < _get_rate(old) * (1 - tolerance):
+            messages.append('{0}: {1:,.0f} rows/sec, baseline {2:,.0f}'
+                .format(name, _get_rate(new), _get_rate(old)))
+        if new['peak_rss_mb'] > old['peak_rss_mb'] * (1 + tolerance):
+            messages.append('{0}: peak RSS {1:.0f} MB, baseline {2:.0f}'
+                .format(name, new['peak_rss_mb'], old['peak_rss_mb']))
+    return messages
+
+
+def print_report(results):
+    """This function prints a table of results."""
+    cols = ['fetch', 'unzip', 'split', 'load', 'total']
+    print '{0:<20} {1:>9} {2:>8} {3:>11} {4:>8} '.format(
+        'case', 'rows', 'file MB', 'rows/sec', 'RSS MB') + ' '.join(
+        '{0:>7}'.format(c) for c in cols)
+    for name, cls, fixture, url in CASES:
+        if name not in results:
+            continue
+        r = results[name]
+        print '{0:<20} {1:>9,} {2:>8.1f} {3:>11,.0f} {4:>8.0f} '.format(
+            name, r['rows'], r['mb'], _get_rate(r), r['peak_rss_mb']
+            ) + ' '.join('{0:>7.3f}'.format(r[c]) for c in cols)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the Atlas collectors on local fixtures.')
+    parser.add_argument('cases', nargs='*',
+        help='cases to run, all by default: {0}'.format(
+            ', '.join(c[0] for c in CASES)))
+    parser.add_argument('--fixtures',
+        help='fixture directory, written where files are missing')
+    parser.add_argument('--scale', type=float, default=1.0,
+        help='fraction of a full day written into new fixtures')
+    parser.add_argument('--repeat', type=int, default=1,
+        help='runs per case; the fastest is reported')
+    parser.add_argument('--save', help='write the results to a json file')
+    parser.add_argument('--baseline', help='json file to compare against')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+
+    path = args.fixtures or os.path.join(tempfile.gettempdir(),
+        'atlas-bench-{0:g}'.format(args.scale))
+    fixtures.write_all(path, args.scale)
+    results = run_all(path, args.cases, args.repeat)
+    print_report(results)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            messages = compare(results, json.load(f), args.tolerance)
+        for m in messages:
+            print 'REGRESSION ' + m
+        if messages:
+            return 1
+    return 0
+
+
+def _timed(method, stage, timings):
+    """This function wraps method so its wall time is added to
+    timings[stage].
+    """
+    def wrapper(*args, **kwargs):
+        start = time.time()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            timings[stage] += time.time() - start
+    return wrapper
+
+
+def _get_max_rss():
+    """This function returns the peak RSS of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    if sys.platform == 'darwin':
+        return peak / 1024.0 ** 2
+    return peak / 1024.0
+
+
+def _get_rate(result):
+    """This function returns the rows per second of result."""
+    return result['rows'] / max(result['total'], 1e-9)
+
+
+def _run_in_process(cls, url, repeat):
+    """This function calls run_case in a child process, so each case
+    starts from a clean heap and reports its own peak RSS.
+    """
+    parent, child = multiprocessing.Pipe(duplex=False)
+
+    def target():
+        try:
+            child.send(run_case(cls, url, repeat))
+        except Exception, er:
+            child.send(er)
+
+    proc = multiprocessing.Process(target=target)
+    proc.start()
+    result = parent.recv()
+    proc.join()
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+if __name__ == '__main__':
+    sys.exit(main())
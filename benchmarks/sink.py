@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+        benchmarks.sink
+        ~~~~~~~~~~~~~~
+        This file checks that PostgresSink stages the rows it is given
+        without turning blank text keys into NULLs, which never conflict
+        in the key index and so defeat the upsert. By default the COPY
+        is replayed against a stand-in cursor that reads the csv the
+        way Postgres does; with --dsn a frame with blank keys is loaded
+        twice into a real database, which needs psycopg2, and the key
+        count must not grow.
+
+        Usage, from the directory holding atlas/:
+
+            python -m benchmarks.sink [--dsn "dbname=atlas_test"]
+
+        The exit status is 1 when a staged key is NULL or a reload adds
+        rows.
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+import argparse
+import re
+import sys
+
+import pandas
+
+from atlas import sink
+
+
+# rows of the sample constraint frame
+ROWS = 20
+
+
+def build_constraints(rows=ROWS):
+    """This function returns an ERCOT constraint DataFrame in get_data
+    layout whose contingency and station keys are blank on every other
+    row, as ERCOT publishes them.
+    """
+    columns = sink.TABLES['constraints'][0]
+    frame = pandas.DataFrame({c: [''] * rows for c in columns})
+    frame['iso'] = 'ERCOT'
+    frame['datatype'] = 'RT_CONSTRAINT'
+    frame['dt_utc'] = pandas.date_range('2018-06-10', periods=rows,
+        freq='5min', tz='UTC')
+    frame['constraint_id'] = [str(i) for i in range(rows)]
+    frame['shadow_price'] = '1.5'
+    for c in ['contingency_name', 'from_station', 'to_station']:
+        frame[c] = ['' if i % 2 else 'X, "Y"' for i in range(rows)]
+    return frame[columns]
+
+
+class CopyCursor(object):
+    """This class stands in for a psycopg2 cursor. copy_expert reads
+    the csv with the rules of Postgres CSV COPY: an unquoted empty
+    field is NULL unless its column is FORCE_NOT_NULL.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.columns = None
+
+    def copy_expert(self, sql, fileobject):
+        self.columns = _get_list(sql, r'_stage \(([^)]*)\)')
+        not_null = set(_get_list(sql, r'FORCE_NOT_NULL \(([^)]*)\)'))
+        for line in fileobject.read().splitlines():
+            row = {}
+            for name, (value, quoted) in zip(self.columns,
+                    _split_csv(line)):
+                if value == '' and not quoted and name not in not_null:
+                    value = None
+                row[name] = value
+            self.rows.append(row)
+
+
+def check_stub(frame):
+    """This function stages frame through PostgresSink.stage on a
+    CopyCursor and returns messages for the key values read as NULL.
+    """
+    cursor = CopyCursor()
+    target = sink.PostgresSink.__new__(sink.PostgresSink)
+    target.connection = type('Connection', (object,),
+        {'cursor': lambda self: cursor})()
+    columns, key = sink.TABLES['constraints']
+    target.stage('constraints', sink.prepare(frame, columns))
+    messages = []
+    for c in key:
+        nulls = sum(1 for row in cursor.rows if row[c] is None)
+        if nulls:
+            messages.append('{0}: {1} of {2} rows staged as NULL'.format(
+                c, nulls, len(cursor.rows)))
+    return messages
+
+
+def check_postgres(frame, dsn):
+    """This function loads frame twice into the database at dsn and
+    returns messages when the second load adds rows.
+    """
+    import psycopg2
+    connection = psycopg2.connect(dsn)
+    cursor = connection.cursor()
+    cursor.execute('DROP TABLE IF EXISTS constraints')
+    connection.commit()
+    target = sink.PostgresSink(connection)
+    counts = []
+    for i in range(2):
+        target.write(frame)
+        target.flush()
+        cursor.execute('SELECT COUNT(*) FROM constraints')
+        counts.append(cursor.fetchone()[0])
+    cursor.execute('DROP TABLE constraints')
+    connection.commit()
+    target.close()
+    if counts[1] != counts[0]:
+        return ['reload went from {0} to {1} rows'.format(*counts)]
+    return []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Check that PostgresSink keeps blank keys.')
+    parser.add_argument('--dsn',
+        help='load into this Postgres database instead of a stand-in')
+    args = parser.parse_args(argv)
+
+    frame = build_constraints()
+    if args.dsn:
+        messages = check_postgres(frame, args.dsn)
+    else:
+        messages = check_stub(frame)
+    for m in messages:
+        print 'FAILED ' + m
+    if messages:
+        return 1
+    print 'ok, {0} rows with blank keys staged as empty text'.format(
+        len(frame))
+    return 0
+
+
+def _get_list(i_sql, i_pattern):
+    """This function returns the comma separated names matched by the
+    group of i_pattern in i_sql.
+    """
+    match = re.search(i_pattern, i_sql)
+    if match is None:
+        return []
+    return [n.strip() for n in match.group(1).split(',')]
+
+
+def _split_csv(i_line):
+    """This function splits a csv line into (value, quoted) pairs."""
+    fields = []
+    value, quoted, inside, i = '', False, False, 0
+    while i < len(i_line):
+        char = i_line[i]
+        if inside:
+            if char == '"' and i_line[i + 1:i + 2] == '"':
+                value += '"'
+                i += 1
+            elif char == '"':
+                inside = False
+            else:
+                value += char
+        elif char == '"':
+            inside = quoted = True
+        elif char == ',':
+            fields.append((value, quoted))
+            value, quoted = '', False
+        else:
+            value += char
+        i += 1
+    fields.append((value, quoted))
+    return fields
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+        benchmarks.startup
+        ~~~~~~~~~~~~~~
+        This file times the startup of processes that only plan work:
+        importing atlas and building the urls of a day with build_url.
+        Each case runs in a fresh interpreter and reports the time from
+        its first import to its last url, and which of the heavy
+        dependencies it loaded. None of them should be, since they are
+        deferred with atlas.lazy until a collector parses a file.
+
+        Usage, from the directory holding atlas/:
+
+            python -m benchmarks.startup [--repeat 5] [--budget 75]
+                [case ...]
+
+        The exit status is 1 when a case takes longer than the budget
+        or imports a heavy dependency.
+
+        :copyright: © 2018 by Veridex
+        :license: MIT, see LICENSE for more details.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+# case name and the code it times
+CASES = [
+    ('import', 'import atlas'),
+    ('plan_urls', '\n'.join([
+        'import datetime',
+        'from atlas.energy import caiso, miso, spp',
+        'day = datetime.datetime(2018, 6, 10)',
+        'miso.MisoLmp.build_url(datatype="RTLMP", date=day)',
+        'miso.MisoLmp.build_url(datatype="DALMP_EXPOST", date=day)',
+        'spp.SppDaLmp.build_url(date=day)',
+        'caiso.CaisoLmp.build_urls(datatype="DALMP_PRC", startdate=day,',
+        '    enddate=day + datetime.timedelta(days=31))',
+    ])),
+]
+# modules a planning process must not load
+HEAVY_MODULES = ['numpy', 'pandas', 'pytz', 'requests']
+# allowed milliseconds per case, interpreter startup not included
+BUDGET_MS = 75.0
+# the timing harness run in each child interpreter
+CHILD = '''
+import json, sys, time
+start = time.time()
+exec compile(sys.argv[1], '<case>', 'exec')
+ms = (time.time() - start) * 1000
+print json.dumps({'ms': ms, 'heavy': [m for m in json.loads(sys.argv[2])
+    if m in sys.modules]})
+'''
+
+
+def run_case(code, repeat=5):
+    """This function runs code in repeat fresh interpreters and returns
+    the fastest time in ms with the heavy modules it loaded.
+    """
+    best = None
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for i in range(repeat):
+        out = subprocess.check_output(
+            [sys.executable, '-c', CHILD, code, json.dumps(HEAVY_MODULES)],
+            cwd=root)
+        result = json.loads(out.strip().splitlines()[-1])
+        if best is None or result['ms'] < best['ms']:
+            best = result
+    return best
+
+
+def check(results, budget=BUDGET_MS):
+    """This function returns a list of messages for the cases in
+    results over budget or loading a heavy module.
+    """
+    messages = []
+    for name, code in CASES:
+        if name not in results:
+            continue
+        r = results[name]
+        if r['ms'] > budget:
+            messages.append('{0}: {1:.1f} ms, budget {2:.1f}'.format(
+                name, r['ms'], budget))
+        if r['heavy']:
+            messages.append('{0}: imports {1}'.format(
+                name, ', '.join(r['heavy'])))
+    return messages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the startup of url planning processes.')
+    parser.add_argument('cases', nargs='*',
+        help='cases to run, all by default: {0}'.format(
+            ', '.join(c[0] for c in CASES)))
+    parser.add_argument('--repeat', type=int, default=5,
+        help='runs per case; the fastest is reported')
+    parser.add_argument('--budget', type=float, default=BUDGET_MS,
+        help='allowed milliseconds per case')
+    args = parser.parse_args(argv)
+
+    results = {}
+    print '{0:<12} {1:>8}  {2}'.format('case', 'ms', 'heavy imports')
+    for name, code in CASES:
+        if args.cases and name not in args.cases:
+            continue
+        results[name] = run_case(code, args.repeat)
+        print '{0:<12} {1:>8.1f}  {2}'.format(name, results[name]['ms'],
+            ', '.join(results[name]['heavy']) or '-')
+    messages = check(results, args.budget)
+    for m in messages:
+        print 'OVER BUDGET ' + m
+    if messages:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())